@@ -0,0 +1,16 @@
+from contextlib import contextmanager
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from rich import print
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+
+@contextmanager
+def timed(message: str) -> Generator[None]:
+    before = perf_counter()
+    yield
+    after = perf_counter()
+    print(f"{message} in {(after - before) * 1e3:.1f}ms")
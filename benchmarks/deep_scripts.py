@@ -0,0 +1,50 @@
+# Usage: python benchmarks/deep_scripts.py
+import os
+
+from _timing import timed
+
+from sb2gs import syntax
+from sb2gs.decompile_sprite import Ctx, decompile_sprite
+from sb2gs.loader import load_target
+
+DEPTH = 10_000
+
+blocks = {
+    "flag": {"opcode": "event_whenflagclicked", "next": "set", "topLevel": True},
+    "set": {
+        "opcode": "data_setvariableto",
+        "next": "if0",
+        "inputs": {"VALUE": [3, "join0", [10, ""]]},
+        "fields": {"VARIABLE": ["x", "x"]},
+    },
+}
+for i in range(DEPTH):
+    operand = [3, f"join{i + 1}", [10, ""]] if i + 1 < DEPTH else [1, [10, "a"]]
+    blocks[f"join{i}"] = {
+        "opcode": "operator_join",
+        "inputs": {"STRING1": operand, "STRING2": [1, [10, "b"]]},
+    }
+    substack = [2, f"if{i + 1}"] if i + 1 < DEPTH else [1, None]
+    blocks[f"if{i}"] = {
+        "opcode": "control_if",
+        "inputs": {"CONDITION": [1, None], "SUBSTACK": substack},
+    }
+target = load_target(
+    {
+        "isStage": True,
+        "name": "Stage",
+        "variables": {"x": ["x", 0]},
+        "lists": {},
+        "costumes": [],
+        "sounds": [],
+        "volume": 100,
+        "blocks": blocks,
+    }
+)
+with (
+    timed(f"decompiled {DEPTH}-deep join and if chains"),
+    open(os.devnull, "w") as file,  # noqa: PTH123
+):
+    ctx = Ctx(target, {}, syntax.Identifiers(), file)
+    decompile_sprite(ctx)
+    ctx.flush()
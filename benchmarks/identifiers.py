@@ -0,0 +1,38 @@
+# Usage: python benchmarks/identifiers.py
+import itertools
+
+from _timing import timed
+
+from sb2gs.syntax import Identifiers
+
+
+def allocate(names: list[str], description: str) -> None:
+    identifiers = Identifiers()
+    with timed(f"allocated {len(names)} identifiers {description}"):
+        for name in names:
+            identifiers.identifier(name)
+
+
+COUNT = 50_000
+
+allocate(
+    [
+        name
+        for i in range(COUNT // 5)
+        for name in (f"var{i}", f"var {i}", f"var.{i}", f"var_{i}", f"Var{i}")
+    ],
+    "colliding in groups of five",
+)
+# Separators are replaced and stripped, so every name sanitizes to `var` and
+# takes the next numeric suffix.
+same_base = [
+    "var" + "".join(separators)
+    for length in range(7)
+    for separators in itertools.product(" .-:_", repeat=length)
+]
+allocate(same_base, "sharing one base name")
+# Numbered names take suffixes ahead of the colliding names, which skip them.
+allocate(
+    [name for i, same in enumerate(same_base) for name in (f"var{2 * i + 3}", same)],
+    "sharing one base name with taken suffixes",
+)
@@ -0,0 +1,18 @@
+# Usage: python benchmarks/literals.py
+from _timing import timed
+
+from sb2gs.syntax import is_goboscript_literal, string
+
+literals = [
+    text
+    for i in range(20_000)
+    for text in (str(i), f"{i / 7}", f"{i}.0", f"item {i}", "-0", "1e5", "")
+]
+with timed(f"classified {len(literals)} literals"):
+    for text in literals:
+        is_goboscript_literal(text)
+
+strings = [f"broadcast {i % 100}" for i in range(200_000)]
+with timed(f"escaped {len(strings)} strings"):
+    for text in strings:
+        string(text)
@@ -0,0 +1,52 @@
+# Usage: python benchmarks/recenter_bitmaps.py DIRECTORY_OF_PNGS
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from _timing import timed
+from PIL import Image
+from rich import print
+
+from sb2gs.costumes import (
+    DEFAULT_COMPRESS_LEVEL,
+    FAST_COMPRESS_LEVEL,
+    fix_bitmap_center,
+)
+from sb2gs.json_object import JSONObject
+
+source = Path(sys.argv[1])
+paths = sorted(source.glob("*.png"))
+sizes = {}
+for path in paths:
+    with Image.open(path) as img:
+        sizes[path.name] = img.size
+
+
+def make_costume(name: str, centered: bool) -> JSONObject:
+    width, height = sizes[name]
+    divisor = 2 if centered else 4
+    return JSONObject(
+        {
+            "dataFormat": "png",
+            "rotationCenterX": width // divisor,
+            "rotationCenterY": height // divisor,
+        }
+    )
+
+
+with timed(f"checked {len(paths)} centered bitmaps"):
+    for path in paths:
+        fix_bitmap_center(make_costume(path.name, centered=True), path)
+
+with tempfile.TemporaryDirectory() as temp:
+    work = Path(temp, "work")
+    for level in (0, FAST_COMPRESS_LEVEL, DEFAULT_COMPRESS_LEVEL, 9):
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.copytree(source, work)
+        with timed(f"recentered {len(paths)} bitmaps at level {level}"):
+            for path in paths:
+                costume = make_costume(path.name, centered=False)
+                fix_bitmap_center(costume, work.joinpath(path.name), level)
+        size = sum(work.joinpath(path.name).stat().st_size for path in paths)
+        print(f"level {level} output is {size / 1e6:.2f}MB")
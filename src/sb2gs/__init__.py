@@ -9,7 +9,9 @@ from typing import TYPE_CHECKING
 from rich import print
 
 from ._logging import setup_logging
-from .decompile import decompile
+from .costumes import DEFAULT_COMPRESS_LEVEL, FAST_COMPRESS_LEVEL
+from .decompile import Pool, decompile
+from .download_cache import DEFAULT_CACHE_SIZE, DownloadCache
 from .sb3_downloader import download_sb3
 from .verify import verify
 
@@ -35,6 +37,26 @@ def entrypoint(func: Callable[[], None]) -> Callable[[], int]:
     return wrapper
 
 
+def add_compression_arguments(argparser: ArgumentParser) -> None:
+    argparser.add_argument(
+        "--png-compression",
+        type=int,
+        choices=range(10),
+        default=DEFAULT_COMPRESS_LEVEL,
+        metavar="LEVEL",
+        help="zlib level (0-9) for costumes that are re-encoded to move their "
+        "rotation center.",
+    )
+    argparser.add_argument(
+        "--fast-png",
+        dest="png_compression",
+        action="store_const",
+        const=FAST_COMPRESS_LEVEL,
+        help="Re-encode costumes quickly at the cost of larger files, e.g. in CI. "
+        f"Same as --png-compression {FAST_COMPRESS_LEVEL}.",
+    )
+
+
 def determine_output_path(input: Path, output: Path | None, overwrite: bool) -> Path:
     output = output or input.parent.joinpath(input.stem)
     if output.exists() and not overwrite:
@@ -57,13 +79,64 @@ def main() -> None:
         help="Invoke goboscript to verify that the decompiled code is valid. This does "
         "not indicate that the decompiled code is equivalent to the original.",
     )
+    argparser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse project.json one target at a time, so that peak memory usage "
+        "scales with the largest sprite instead of the whole project.",
+    )
+    argparser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Decompile targets in this many workers.",
+    )
+    argparser.add_argument(
+        "--pool",
+        type=Pool,
+        choices=list(Pool),
+        default=Pool.PROCESS,
+        help="Run workers as processes, threads (scales on free-threaded builds) or "
+        "subinterpreters.",
+    )
+    argparser.add_argument(
+        "--store",
+        type=Path,
+        help="Keep extracted assets in this directory, shared across runs, and link "
+        "them into the output instead of copying them.",
+    )
+    argparser.add_argument(
+        "--cache",
+        type=Path,
+        help="Keep downloaded project JSON and assets in this directory, and reuse "
+        "them in later --id downloads.",
+    )
+    argparser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE >> 20,
+        metavar="MB",
+        help="Evict the least recently used downloads once the cache grows past this "
+        "size.",
+    )
+    add_compression_arguments(argparser)
     args = argparser.parse_args()
     if args.input.suffix != ".sb3":
         logger.error("input must be a `.sb3` file.")
         sys.exit(1)
     args.output = determine_output_path(args.input, args.output, args.overwrite)
     if args.id and not args.input.exists():
-        download_sb3(args.id, args.input)
-    decompile(args.input, args.output)
+        cache = args.cache and DownloadCache(args.cache, args.cache_size << 20)
+        download_sb3(args.id, args.input, cache=cache)
+    decompile(
+        args.input,
+        args.output,
+        stream=args.stream,
+        jobs=args.jobs,
+        pool=args.pool,
+        store=args.store,
+        compress_level=args.png_compression,
+    )
     if args.verify:
         verify(args.output)
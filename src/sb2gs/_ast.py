@@ -1,103 +1,158 @@
-import functools
 import logging
+from collections import Counter
+from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any
 
 from . import inputs
+from ._types import InputKind
 from .decompile_expr import OPERATORS
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import Callable, Iterable
 
-    from ._types import Block
+    from ._types import Block, Input
     from .decompile_sprite import Ctx
 
 logger = logging.getLogger(__name__)
 
+ZERO_LITERALS = {"", "0", "0.0"}
+# A rewrite can enable another one on the same block or on the block that
+# consumes it, so those are transformed again until nothing changes, up to this
+# many rounds.
+MAX_ROUNDS = 8
 
-type Transformer = Callable[[Ctx, Block], None]
 
+type Transformer = Callable[[Ctx, Block], bool]
 
-transformers: list[Transformer] = []
 
+@dataclass(frozen=True, slots=True)
+class Pass:
+    name: str
+    order: int
+    transform: Transformer
 
-def transformer(opcode: str) -> Callable[[Transformer], Transformer]:
-    def decorator(func: Transformer) -> Transformer:
-        @functools.wraps(func)
-        def wrapper(ctx: Ctx, block: Block) -> None:
-            if block.opcode != opcode:
-                return
-            func(ctx, block)
 
-        transformers.append(wrapper)
-        return wrapper
+# Passes for each opcode, sorted by order and then by registration order.
+transformers: dict[str, list[Pass]] = {}
 
-    return decorator
 
+def transformer(opcode: str, order: int = 0) -> Callable[[Transformer], Transformer]:
+    def decorator(func: Transformer) -> Transformer:
+        passes = transformers.setdefault(opcode, [])
+        passes.append(Pass(func.__name__, order, func))
+        passes.sort(key=lambda p: p.order)
+        return func
 
-def compare_inputs(
-    ctx: Ctx,
-    input1: list[Any] | None,
-    input2: list[Any] | None,
-) -> bool:
-    input1_block_id = inputs.block_id(input1)
-    input2_block_id = inputs.block_id(input2)
-    if not compare_tree(
-        ctx,
-        None if input1_block_id is None else ctx.blocks[input1_block_id],
-        None if input2_block_id is None else ctx.blocks[input2_block_id],
-    ):
-        return False
-    input1_value = inputs.block_value(input1)
-    input2_value = inputs.block_value(input2)
-    return input1_value == input2_value
+    return decorator
 
 
-def compare_tree(ctx: Ctx, node1: Block | None, node2: Block | None) -> bool:
+type Structure = tuple[Any, ...]
+
+
+def input_structure(
+    structures: list[int | None], input: Input | None
+) -> Input | int | None:
+    if input is None or input.kind is InputKind.EMPTY:
+        return None
+    if input.kind is InputKind.BLOCK:
+        return structures[input.value]
+    return input
+
+
+def block_structure(structures: list[int | None], block: Block) -> Structure:
+    return (
+        block.opcode,
+        tuple(sorted((name, tuple(value)) for name, value in block.fields.items())),
+        tuple(
+            sorted(
+                (name, input_structure(structures, input))
+                for name, input in block.inputs.items()
+            )
+        ),
+    )
+
+
+def hash_cons(blocks: list[Block], children: list[list[int]]) -> list[int | None]:
+    # Gives every block a structure ID, bottom-up, such that two blocks have the
+    # same ID exactly when their trees are equal. Children are keyed by their
+    # IDs, so the table's own equality check on hash collisions stays shallow.
+    table: dict[Structure, int] = {}
+    structures: list[int | None] = [None] * len(blocks)
+    # 0: not visited, 1: waiting for its inputs, 2: done.
+    states = bytearray(len(blocks))
+    for root in range(len(blocks)):
+        stack = [root]
+        while stack:
+            block_id = stack[-1]
+            block = blocks[block_id]
+            if states[block_id] == 0 and not isinstance(block, list):
+                states[block_id] = 1
+                stack.extend(
+                    child for child in children[block_id] if states[child] == 0
+                )
+                continue
+            stack.pop()
+            if states[block_id] == 2:
+                continue
+            states[block_id] = 2
+            if isinstance(block, list):
+                structure = tuple(block)
+            else:
+                structure = block_structure(structures, block)
+            structures[block_id] = table.setdefault(structure, len(table))
+    return structures
+
+
+def compare_tree(ctx: Ctx, node1: int | None, node2: int | None) -> bool:
     if node1 is None or node2 is None:
         return node1 == node2
-    if node1.opcode != node2.opcode:
-        return False
-    if node1.fields._ != node2.fields._:
-        return False
-    for node1_input_name, node1_input_value in node1.inputs._.items():
-        node2_input_value = node2.inputs._.get(node1_input_name)
-        if node2_input_value is None:
-            return False
-        if not compare_inputs(ctx, node1_input_value, node2_input_value):
-            return False
+    return ctx.structures[node1] == ctx.structures[node2]
 
-    return True
+
+def compare_inputs(
+    ctx: Ctx,
+    input1: Input | None,
+    input2: Input | None,
+) -> bool:
+    return input_structure(ctx.structures, input1) == input_structure(
+        ctx.structures, input2
+    )
 
 
 def flatten_menu(ctx: Ctx, block: Block, menu_name: str) -> None:
-    menu_id = inputs.block_id(block.inputs._.get(menu_name))
+    menu_id = inputs.block_id(block.inputs.get(menu_name))
     if menu_id is None:
         return
     menu = ctx.blocks[menu_id]
-    block.fields._.update(menu.fields._)
+    block.fields.update(menu.fields)
 
 
 @transformer("data_listcontainsitem")
-def transform_list_contains_to_item_num(_ctx: Ctx, block: Block) -> None:
+def transform_list_contains_to_item_num(_ctx: Ctx, block: Block) -> bool:
     block.opcode = "data_itemnumoflist"
+    return True
 
 
 @transformer("operator_subtract")
-def transform_subtract_zero_to_negative(_ctx: Ctx, block: Block) -> None:
-    if inputs.block_value(block.inputs.NUM1) in {"", "0", "0.0"}:
+def transform_subtract_zero_to_negative(_ctx: Ctx, block: Block) -> bool:
+    if inputs.literal(block.inputs["NUM1"]) in ZERO_LITERALS:
         block.opcode = "operator_negative"
+        return True
+    return False
 
 
 @transformer("data_changevariableby")
-def transform_change_variable_by_negative(ctx: Ctx, block: Block) -> None:
+def transform_change_variable_by_negative(ctx: Ctx, block: Block) -> bool:
     if not (
-        (operand := inputs.block(ctx, block, "VALUE"))
+        block.operator in {None, "+"}
+        and (operand := inputs.block(ctx, block, "VALUE"))
         and operand.opcode in {"operator_subtract", "operator_negative"}
-        and inputs.block_value(operand.inputs.NUM1) in {"", "0", "0.0"}
+        and inputs.literal(operand.inputs["NUM1"]) in ZERO_LITERALS
     ):
-        return
-    block._["OPERATOR"] = "-"
-    block.inputs._["VALUE"] = operand.inputs.NUM2
+        return False
+    block.operator = "-"
+    block.inputs["VALUE"] = operand.inputs["NUM2"]
+    return True
 
 
 ARITHMETIC_OPCODES = {
@@ -110,76 +165,109 @@ ARITHMETIC_OPCODES = {
 
 
 @transformer("data_setvariableto")
-def transform_augmented_set_variable(ctx: Ctx, block: Block) -> None:
+def transform_augmented_set_variable(ctx: Ctx, block: Block) -> bool:
     if not (
         (operand := inputs.block(ctx, block, "VALUE"))
         and operand.opcode in ARITHMETIC_OPCODES
-        and inputs.variable(operand.inputs.NUM1) == block.fields.VARIABLE[0]
+        and inputs.variable(operand.inputs["NUM1"]) == block.fields["VARIABLE"][0]
     ):
-        return
+        return False
     block.opcode = "data_changevariableby"
-    block._["OPERATOR"] = OPERATORS[operand.opcode].symbol
-    block.inputs._["VALUE"] = operand.inputs.NUM2
+    block.operator = OPERATORS[operand.opcode].symbol
+    block.inputs["VALUE"] = operand.inputs["NUM2"]
+    return True
 
 
 @transformer("data_setvariableto")
-def transform_augmented_set_variable_join(ctx: Ctx, block: Block) -> None:
+def transform_augmented_set_variable_join(ctx: Ctx, block: Block) -> bool:
     if not (
         (operand := inputs.block(ctx, block, "VALUE"))
         and operand.opcode == "operator_join"
-        and inputs.variable(operand.inputs.STRING1) == block.fields.VARIABLE[0]
+        and inputs.variable(operand.inputs["STRING1"]) == block.fields["VARIABLE"][0]
     ):
-        return
+        return False
     block.opcode = "data_changevariableby"
-    block._["OPERATOR"] = "&"
-    block.inputs._["VALUE"] = operand.inputs.STRING2
+    block.operator = "&"
+    block.inputs["VALUE"] = operand.inputs["STRING2"]
+    return True
 
 
 @transformer("data_replaceitemoflist")
-def transform_augmented_replace_list_item(ctx: Ctx, block: Block) -> None:
+def transform_augmented_replace_list_item(ctx: Ctx, block: Block) -> bool:
     if not (
-        (operand := inputs.block(ctx, block, "ITEM"))
+        block.operator is None
+        and (operand := inputs.block(ctx, block, "ITEM"))
         and operand.opcode in ARITHMETIC_OPCODES
         and (lhs := inputs.block(ctx, operand, "NUM1"))
         and lhs.opcode == "data_itemoflist"
-        and lhs.fields.LIST[0] == block.fields.LIST[0]
+        and lhs.fields["LIST"][0] == block.fields["LIST"][0]
         and compare_inputs(
             ctx,
-            block.inputs._.get("INDEX"),
-            lhs.inputs._.get("INDEX"),
+            block.inputs.get("INDEX"),
+            lhs.inputs.get("INDEX"),
         )
     ):
-        return
-    block._["OPERATOR"] = OPERATORS[operand.opcode].symbol
-    block.inputs._["ITEM"] = operand.inputs.NUM2
+        return False
+    block.operator = OPERATORS[operand.opcode].symbol
+    block.inputs["ITEM"] = operand.inputs["NUM2"]
+    return True
 
 
 @transformer("data_replaceitemoflist")
-def transform_augmented_replace_list_item_join(ctx: Ctx, block: Block) -> None:
+def transform_augmented_replace_list_item_join(ctx: Ctx, block: Block) -> bool:
     if not (
-        (operand := inputs.block(ctx, block, "ITEM"))
+        block.operator is None
+        and (operand := inputs.block(ctx, block, "ITEM"))
         and operand.opcode == "operator_join"
         and (lhs := inputs.block(ctx, operand, "STRING1"))
         and lhs.opcode == "data_itemoflist"
-        and lhs.fields.LIST[0] == block.fields.LIST[0]
-        and compare_tree(
+        and lhs.fields["LIST"][0] == block.fields["LIST"][0]
+        and compare_inputs(
             ctx,
-            inputs.block(ctx, block, "INDEX"),
-            inputs.block(ctx, lhs, "INDEX"),
+            block.inputs.get("INDEX"),
+            lhs.inputs.get("INDEX"),
         )
     ):
-        return
-    block._["OPERATOR"] = "&"
-    block.inputs._["ITEM"] = operand.inputs.STRING2
-
-
-def transform_block(ctx: Ctx, block: Block) -> None:
-    for transformer in transformers:
-        transformer(ctx, block)
+        return False
+    block.operator = "&"
+    block.inputs["ITEM"] = operand.inputs["STRING2"]
+    return True
 
 
-def transform(ctx: Ctx) -> None:
-    for block in ctx.blocks.values():
-        if isinstance(block, list):
+def transform_block(ctx: Ctx, block: Block, hits: Counter[str]) -> bool:
+    opcode = block.opcode
+    changed = False
+    for p in transformers.get(opcode, ()):
+        if not p.transform(ctx, block):
             continue
-        transform_block(ctx, block)
+        hits[p.name] += 1
+        changed = True
+        if block.opcode != opcode:
+            # The passes for the new opcode run in the next round.
+            break
+    return changed
+
+
+def transform(ctx: Ctx) -> Counter[str]:
+    ctx.structures = hash_cons(ctx.blocks, ctx.index.children)
+    hits: Counter[str] = Counter()
+    worklist: Iterable[int] = sorted(
+        block_id
+        for opcode in transformers
+        for block_id in ctx.index.opcodes.get(opcode, ())
+    )
+    for _ in range(MAX_ROUNDS):
+        changed: dict[int, None] = {}
+        for block_id in worklist:
+            block = ctx.blocks[block_id]
+            if isinstance(block, list) or not transform_block(ctx, block, hits):
+                continue
+            changed[block_id] = None
+            if (parent := ctx.index.parents[block_id]) is not None:
+                changed[parent] = None
+        if not changed:
+            break
+        worklist = changed
+    for name, count in hits.items():
+        logger.info("%s: %d hits", name, count)
+    return hits
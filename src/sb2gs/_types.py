@@ -1,7 +1,7 @@
+import dataclasses
 from dataclasses import dataclass, field
 from enum import IntEnum
-
-from .json_object import JSONObject
+from typing import Any, Self
 
 
 class InputType(IntEnum):
@@ -17,19 +17,88 @@ class InputType(IntEnum):
     LIST = 13
 
 
-@dataclass
-class Block(JSONObject):
+class InputKind(IntEnum):
+    EMPTY = 0
+    BLOCK = 1
+    LITERAL = 2
+    VARIABLE = 3
+    LIST = 4
+    BROADCAST = 5
+
+
+@dataclass(frozen=True, slots=True)
+class Input:
+    kind: InputKind
+    # Block ID for BLOCK, name for VARIABLE, LIST and BROADCAST.
+    value: Any = None
+
+
+EMPTY_INPUT = Input(InputKind.EMPTY)
+
+
+@dataclass(slots=True)
+class Mutation:
+    proccode: str | None = None
+    argumentids: str | None = None
+    argumentnames: str | None = None
+    argumentdefaults: str | None = None
+    warp: str | bool | None = None
+    hasnext: str | bool | None = None
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> Self:
+        return cls(
+            data.get("proccode"),
+            data.get("argumentids"),
+            data.get("argumentnames"),
+            data.get("argumentdefaults"),
+            data.get("warp"),
+            data.get("hasnext"),
+        )
+
+
+@dataclass(slots=True)
+class Block:
     opcode: str
-    next: str | None = None
-    parent: str | None = None
-    inputs: JSONObject = field(default_factory=lambda: JSONObject({}))
-    fields: JSONObject[tuple[str, str | None]] = field(
-        default_factory=lambda: JSONObject({})
-    )
+    next: int | None = None
+    parent: int | None = None
+    inputs: dict[str, Input] = field(default_factory=dict)
+    fields: dict[str, list[Any]] = field(default_factory=dict)
     shadow: bool = False
     topLevel: bool = False
     x: int = 0
     y: int = 0
+    mutation: Mutation | None = None
+    operator: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Procedure:
+    proccode: str
+    name: str
+    argument_ids: tuple[str, ...]
+    argument_names: tuple[str, ...]
+    warp: bool
+
+
+@dataclass(slots=True)
+class Index:
+    # Top-level blocks, in the order they appear in the project.
+    roots: list[int] = field(default_factory=list)
+    # The block whose input or next refers to each block.
+    parents: list[int | None] = field(default_factory=list)
+    # The blocks each block refers to through its inputs.
+    children: list[list[int]] = field(default_factory=list)
+    opcodes: dict[str, list[int]] = field(default_factory=dict)
+    # Procedures by proccode, from their prototypes, or from calls to them if a
+    # prototype is missing.
+    procedures: dict[str, Procedure] = field(default_factory=dict)
+
+
+@dataclass(frozen=True, slots=True)
+class Variant:
+    opcode: str
+    inputs: tuple[str, ...]
 
 
 @dataclass
@@ -39,3 +108,14 @@ class Signature:
     menu: str | None = None
     field: str | None = None
     overloads: dict[str, str] | None = None
+    # Resolved once here, so that decompiling a block never copies a signature.
+    default: Variant = dataclasses.field(init=False, repr=False)
+    variants: dict[str, Variant] = dataclasses.field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.default = Variant(self.opcode, tuple(self.inputs))
+        inputs = tuple(name for name in self.inputs if name != self.field)
+        self.variants = {
+            value: Variant(opcode, inputs)
+            for value, opcode in (self.overloads or {}).items()
+        }
@@ -0,0 +1,354 @@
+import ctypes
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from rich import print
+from rich.progress import (
+    BarColumn,
+    MofNCompleteColumn,
+    Progress,
+    TextColumn,
+    TimeElapsedColumn,
+    TimeRemainingColumn,
+)
+
+from . import add_compression_arguments, entrypoint
+from ._logging import setup_logging
+from .costumes import DEFAULT_COMPRESS_LEVEL
+from .decompile import decompile
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from concurrent.futures import Future
+    from multiprocessing.context import BaseContext
+    from types import FrameType
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies takes every pending project in its pool down with it. A
+# project is only charged an attempt for a worker that died while it was the
+# only one running, and gives up after this many.
+MAX_ATTEMPTS = 3
+
+
+@dataclass
+class Options:
+    timeout: float | None = None
+    overwrite: bool = False
+    stream: bool = False
+    store: Path | None = None
+    compress_level: int = DEFAULT_COMPRESS_LEVEL
+
+
+@dataclass
+class Result:
+    input: str
+    output: str
+    status: str
+    error: str | None = None
+    seconds: float = 0.0
+
+
+def find_projects(sources: list[str]) -> list[Path]:
+    projects: list[Path] = []
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            projects.extend(sorted(path.glob("*.sb3")))
+        elif path.suffix == ".sb3" and path.is_file():
+            projects.append(path)
+        elif path.is_file():
+            # Manifest with one .sb3 path per line.
+            lines = path.read_text().splitlines()
+            projects.extend(
+                Path(line.strip())
+                for line in lines
+                if line.strip() and not line.lstrip().startswith("#")
+            )
+        else:
+            projects.extend(sorted(Path(match) for match in glob.glob(source)))  # noqa: PTH207
+    return list(dict.fromkeys(projects))
+
+
+def get_output_paths(projects: list[Path], output: Path | None) -> list[Path]:
+    outputs: list[Path] = []
+    seen: set[Path] = set()
+    for project in projects:
+        parent = output or project.parent
+        path = parent.joinpath(project.stem)
+        i = 2
+        while path in seen:
+            path = parent.joinpath(f"{project.stem} ({i})")
+            i += 1
+        seen.add(path)
+        outputs.append(path)
+    return outputs
+
+
+class ProjectTimeoutError(Exception):
+    # Not a TimeoutError, which is an OSError that the decompiler catches when
+    # falling back from a failed copy or link.
+    pass
+
+
+def raise_timeout(_signum: int, _frame: FrameType | None) -> None:
+    raise ProjectTimeoutError
+
+
+def decompile_project(input: Path, output: Path, options: Options) -> Result:
+    result = Result(str(input), str(output), "ok")
+    if output.exists() and not options.overwrite:
+        result.status = "error"
+        result.error = "output directory already exists"
+        return result
+    has_alarm = hasattr(signal, "SIGALRM")
+    if has_alarm and options.timeout is not None:
+        signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, options.timeout)
+    before = perf_counter()
+    try:
+        decompile(
+            input,
+            output,
+            stream=options.stream,
+            store=options.store,
+            compress_level=options.compress_level,
+        )
+    except ProjectTimeoutError:
+        result.status = "timeout"
+        result.error = f"exceeded {options.timeout}s"
+    except Exception as error:  # noqa: BLE001
+        result.status = "error"
+        result.error = f"{type(error).__name__}: {error}"
+    finally:
+        if has_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    result.seconds = perf_counter() - before
+    return result
+
+
+# Set in worker processes by `init_worker`. Each project's flag is set as it
+# starts, so that when a worker dies, projects that had not started yet are
+# not suspected of killing it.
+started_flags: ctypes.Array[ctypes.c_byte] | None = None
+
+
+def init_worker(started: ctypes.Array[ctypes.c_byte]) -> None:
+    global started_flags  # noqa: PLW0603
+    started_flags = started
+    setup_logging()
+
+
+def start_project(index: int, input: Path, output: Path, options: Options) -> Result:
+    if started_flags is not None:
+        started_flags[index] = 1
+    return decompile_project(input, output, options)
+
+
+def get_context() -> BaseContext:
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        # Workers are forked from a server that has already imported the
+        # decompiler.
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["sb2gs.batch"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def create_executor(
+    jobs: int, context: BaseContext, started: ctypes.Array[ctypes.c_byte]
+) -> ProcessPoolExecutor:
+    # Each project runs in a fresh process, so nothing a project leaks or
+    # changes, such as memory or signal handlers, carries over to the next.
+    return ProcessPoolExecutor(
+        jobs,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(started,),
+        max_tasks_per_child=1,
+    )
+
+
+def run_round(
+    batch: list[tuple[Path, Path]],
+    jobs: int,
+    options: Options,
+    record: Callable[[Result], None],
+) -> tuple[list[tuple[Path, Path]], list[tuple[Path, Path]]]:
+    # Records the result of every project that completes. Returns the projects
+    # lost to a worker dying, split into those that had started and those that
+    # had not.
+    context = get_context()
+    started = context.RawArray(ctypes.c_byte, len(batch))
+    crashed: list[tuple[Path, Path]] = []
+    unstarted: list[tuple[Path, Path]] = []
+    with create_executor(jobs, context, started) as executor:
+        futures: dict[Future[Result], int] = {}
+        for index, (input, output) in enumerate(batch):
+            future = executor.submit(start_project, index, input, output, options)
+            futures[future] = index
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                record(future.result())
+            except BrokenProcessPool:
+                if started[index]:
+                    crashed.append(batch[index])
+                else:
+                    unstarted.append(batch[index])
+    return crashed, unstarted
+
+
+def run_batch(
+    projects: list[Path], outputs: list[Path], jobs: int, options: Options
+) -> list[Result]:
+    results: dict[str, Result] = {}
+    attempts: Counter[Path] = Counter()
+    pending = list(zip(projects, outputs, strict=True))
+    # Projects that were running alongside others when a worker died. Any of
+    # them may have killed it, so they are retried one at a time.
+    suspects: list[tuple[Path, Path]] = []
+    failed = 0
+    before = perf_counter()
+    with Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TextColumn("[red]{task.fields[failed]} failed"),
+        TextColumn("{task.fields[rate]:.2f} projects/s"),
+        TimeElapsedColumn(),
+        TimeRemainingColumn(),
+    ) as progress:
+        task = progress.add_task("Decompiling", total=len(projects), failed=0, rate=0)
+
+        def record(result: Result) -> None:
+            nonlocal failed
+            results[result.input] = result
+            if result.status != "ok":
+                failed += 1
+                logger.error("%s: %s (%s)", result.input, result.status, result.error)
+            progress.update(
+                task,
+                advance=1,
+                failed=failed,
+                rate=len(results) / (perf_counter() - before),
+            )
+
+        while pending or suspects:
+            # Suspects run one at a time, so that a worker dying is blamed on
+            # the one project it was running.
+            alone = jobs == 1 or not pending
+            batch = pending or suspects
+            crashed, unstarted = run_round(batch, 1 if alone else jobs, options, record)
+            if unstarted and not crashed:
+                # Workers died before starting any project. Every project is
+                # charged, so that this cannot go on forever.
+                crashed, unstarted, alone = unstarted, [], True
+            if pending:
+                pending = unstarted
+            else:
+                suspects = unstarted
+            if not alone:
+                suspects += crashed
+                continue
+            for input, output in crashed:
+                attempts[input] += 1
+                if attempts[input] < MAX_ATTEMPTS:
+                    suspects.append((input, output))
+                else:
+                    result = Result(
+                        str(input), str(output), "crashed", "worker process died"
+                    )
+                    record(result)
+    return [results[str(project)] for project in projects]
+
+
+def summarize(results: list[Result], seconds: float) -> dict[str, Any]:
+    succeeded = sum(result.status == "ok" for result in results)
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "timed_out": sum(result.status == "timeout" for result in results),
+        "seconds": seconds,
+        "projects": [asdict(result) for result in results],
+    }
+
+
+@entrypoint
+def main() -> None:
+    setup_logging()
+    argparser = ArgumentParser("sb2gs-batch")
+    argparser.add_argument(
+        "sources",
+        nargs="+",
+        help="Directories, glob patterns, .sb3 files, or manifest files listing one "
+        ".sb3 path per line.",
+    )
+    argparser.add_argument(
+        "--output",
+        type=Path,
+        help="Write each project to a directory named after it inside this "
+        "directory, instead of next to the input.",
+    )
+    argparser.add_argument("--overwrite", action="store_true")
+    argparser.add_argument("--stream", action="store_true")
+    argparser.add_argument(
+        "--store",
+        type=Path,
+        help="Keep extracted assets in this directory, shared by all projects, and "
+        "link them into the outputs instead of copying them.",
+    )
+    add_compression_arguments(argparser)
+    argparser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes.",
+    )
+    argparser.add_argument(
+        "--timeout",
+        type=float,
+        help="Give up on a project after this many seconds. Not enforced on "
+        "platforms without SIGALRM.",
+    )
+    argparser.add_argument(
+        "--summary",
+        type=Path,
+        default=Path("sb2gs-batch.json"),
+        help="Write a JSON summary of successes, failures and timings to this file.",
+    )
+    args = argparser.parse_args()
+    projects = find_projects(args.sources)
+    if not projects:
+        logger.error("no .sb3 files found.")
+        sys.exit(1)
+    outputs = get_output_paths(projects, args.output)
+    before = perf_counter()
+    options = Options(
+        args.timeout, args.overwrite, args.stream, args.store, args.png_compression
+    )
+    results = run_batch(projects, outputs, args.jobs, options)
+    summary = summarize(results, perf_counter() - before)
+    args.summary.write_text(json.dumps(summary, indent=2))
+    color = "[red]" if summary["failed"] else "[green]"
+    print(
+        f"{color}{summary['succeeded']}/{summary['total']} projects decompiled[/] "
+        f"({summary['failed']} failed)"
+    )
+    if summary["failed"]:
+        sys.exit(1)
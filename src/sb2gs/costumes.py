@@ -1,10 +1,17 @@
 import logging
+import os
+import re
+import struct
 import xml.etree.ElementTree as ET
-from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, BinaryIO
+from xml.parsers import expat
 
-from PIL import Image
+from .extract import copy_range
+from .utils import unwrap
 
 if TYPE_CHECKING:
+    from collections.abc import Generator, Sequence
     from pathlib import Path
 
     from .json_object import JSONObject
@@ -15,15 +22,98 @@ svg = "{http://www.w3.org/2000/svg}"
 ET.register_namespace("", "http://www.w3.org/2000/svg")
 ET.register_namespace("xlink", "http://www.w3.org/1999/xlink")
 
+# Costumes are fixed by up to this many threads. Pillow releases the GIL while
+# decoding and encoding images.
+FIX_THREADS = 8
+SVG_CHUNK_SIZE = 1024
+# Name of an SVG <g> element, as reported by expat with namespace processing.
+SVG_GROUP = "http://www.w3.org/2000/svg g"
+START_TAG_RE = re.compile(
+    rb"<[^\s/>]+(?:\s+[^\s=/>]+\s*=\s*(?:\"[^\"]*\"|'[^']*'))*\s*/?>"
+)
+TAG_NAME_RE = re.compile(rb"<[^\s/>]+")
+ATTRIBUTE_RE = re.compile(rb"\s+([^\s=/>]+)\s*=\s*(?:\"[^\"]*\"|'[^']*')")
+# Attributes set to None are removed.
+ROOT_ATTRIBUTES: dict[bytes, bytes | None] = {
+    b"width": b"480",
+    b"height": b"360",
+    b"viewBox": b"0,0,480,360",
+}
+GROUP_ATTRIBUTES: dict[bytes, bytes | None] = {b"transform": None}
+# zlib levels for re-encoded PNGs. Pillow defaults to 6, and 1 is several times
+# faster for slightly larger files.
+DEFAULT_COMPRESS_LEVEL = 6
+FAST_COMPRESS_LEVEL = 1
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Signature, then the IHDR chunk's length, type, width and height.
+PNG_HEADER = struct.Struct(">8sL4sLL")
 
-def fix_vector_center(costume: JSONObject, path: Path) -> None:
+
+def iter_start_tags(
+    file: BinaryIO,
+) -> Generator[tuple[int, int, str, dict[str, str]]]:
+    # Yields the byte offset, depth, name and attributes of each start tag,
+    # reading the file only as far as the caller iterates.
+    tags: list[tuple[int, int, str, dict[str, str]]] = []
+    depth = 0
+    parser = expat.ParserCreate(namespace_separator=" ")
+
+    def start(name: str, attributes: dict[str, str]) -> None:
+        nonlocal depth
+        depth += 1
+        tags.append((parser.CurrentByteIndex, depth, name, attributes))
+
+    def end(_name: str) -> None:
+        nonlocal depth
+        depth -= 1
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    while chunk := file.read(SVG_CHUNK_SIZE):
+        parser.Parse(chunk, False)
+        yield from tags
+        tags.clear()
+    parser.Parse(b"", True)
+    yield from tags
+
+
+def read_start_tag(file: BinaryIO, offset: int) -> bytes | None:
+    # Returns None if the tag is not in an ASCII compatible encoding.
+    size = SVG_CHUNK_SIZE
+    while True:
+        file.seek(offset)
+        data = file.read(size)
+        if match := START_TAG_RE.match(data):
+            return match[0]
+        if len(data) < size:
+            return None
+        size *= 2
+
+
+def rewrite_start_tag(tag: bytes, attributes: dict[bytes, bytes | None]) -> bytes:
+    # Sets attributes of the tag, or removes those set to None, leaving
+    # everything else as written.
+    name = unwrap(TAG_NAME_RE.match(tag))
+    parts = [name[0]]
+    pending = dict(attributes)
+    position = name.end()
+    while attribute := ATTRIBUTE_RE.match(tag, position):
+        position = attribute.end()
+        if attribute[1] not in pending:
+            parts.append(attribute[0])
+        elif (value := pending.pop(attribute[1])) is not None:
+            parts.append(b' %s="%s"' % (attribute[1], value))
+    for key, value in pending.items():
+        if value is not None:
+            parts.append(b' %s="%s"' % (key, value))
+    parts.append(tag[position:])
+    return b"".join(parts)
+
+
+def rewrite_vector_tree(path: Path) -> None:
+    # Fallback for documents in encodings that are not ASCII compatible.
     et = ET.parse(path)
     root = et.getroot()
-    if (
-        float(root.attrib.get("width", "0")) / 2 == costume.rotationCenterX
-        and float(root.attrib.get("height", "0")) / 2 == costume.rotationCenterY
-    ):
-        return
     root.set("width", "480")
     root.set("height", "360")
     root.set("viewBox", "0,0,480,360")
@@ -31,27 +121,120 @@ def fix_vector_center(costume: JSONObject, path: Path) -> None:
     if group is None:
         return
     group.attrib.pop("transform", None)
+    # The file may be linked to the asset store, so it is replaced instead of
+    # being overwritten.
+    path.unlink()
     with path.open("wb") as file:
         et.write(file, encoding="utf-8", xml_declaration=False)
 
 
-def fix_bitmap_center(costume: JSONObject, path: Path) -> None:
-    img = Image.open(path)
-    if (
-        costume.rotationCenterX == img.width // 2
-        and costume.rotationCenterY == img.height // 2
-    ):
-        return
-    fixed = Image.new("RGBA", (960, 720), (0, 0, 0, 0))
-    fixed.paste(img, (480 - costume.rotationCenterX, 360 - costume.rotationCenterY))
-    fixed.save(path, format=costume.dataFormat)
+def get_bitmap_size(path: Path) -> tuple[int, int]:
+    with path.open("rb") as file:
+        header = file.read(PNG_HEADER.size)
+    if len(header) == PNG_HEADER.size:
+        signature, _, chunk_type, width, height = PNG_HEADER.unpack(header)
+        if signature == PNG_SIGNATURE and chunk_type == b"IHDR":
+            return width, height
+    from PIL import Image
 
+    # Only reads the header, the image is decoded on first use.
+    with Image.open(path) as img:
+        return img.size
 
-def fix_center(costume: JSONObject, path: Path, fixed: set[str]) -> None:
-    if costume.md5ext in fixed:
+
+def fix_vector_center(costume: JSONObject, path: Path) -> None:
+    # Only the root element and its first group are rewritten, everything else
+    # is copied through byte for byte.
+    partial = path.with_name(path.name + ".part")
+    streamed = False
+    with path.open("rb") as src:
+        tags = iter_start_tags(src)
+        root_offset, _, _, attributes = next(tags)
+        width = float(attributes.get("width", "0"))
+        height = float(attributes.get("height", "0"))
+        if (
+            width / 2 == costume.rotationCenterX
+            and height / 2 == costume.rotationCenterY
+        ):
+            return
+        group_offset = next(
+            (
+                offset
+                for offset, depth, name, _ in tags
+                if depth == 2 and name == SVG_GROUP
+            ),
+            None,
+        )
+        tags.close()
+        if group_offset is None:
+            return
+        root_tag = read_start_tag(src, root_offset)
+        group_tag = read_start_tag(src, group_offset)
+        if root_tag is not None and group_tag is not None:
+            with partial.open("wb", buffering=0) as dest:
+                copy_range(src, dest, 0, root_offset)
+                dest.write(rewrite_start_tag(root_tag, ROOT_ATTRIBUTES))
+                end = root_offset + len(root_tag)
+                copy_range(src, dest, end, group_offset - end)
+                dest.write(rewrite_start_tag(group_tag, GROUP_ATTRIBUTES))
+                end = group_offset + len(group_tag)
+                copy_range(src, dest, end, os.fstat(src.fileno()).st_size - end)
+            streamed = True
+    if streamed:
+        # Renaming also leaves alone any copy linked to the asset store.
+        partial.replace(path)
+    else:
+        rewrite_vector_tree(path)
+
+
+def get_padding(size: int, center: int) -> tuple[int, int]:
+    # Returns the smallest length with `center` in its middle that still holds
+    # the whole image, and the image's offset in it.
+    half = max(center, size - center)
+    return half * 2, half - center
+
+
+def fix_bitmap_center(
+    costume: JSONObject, path: Path, compress_level: int = DEFAULT_COMPRESS_LEVEL
+) -> None:
+    width, height = get_bitmap_size(path)
+    if costume.rotationCenterX == width // 2 and costume.rotationCenterY == height // 2:
         return
-    fixed.add(costume.md5ext)
+    # Pillow is imported lazily so that worker subinterpreters, which only
+    # decompile code, never load its extension module.
+    from PIL import Image
+
+    canvas_width, x = get_padding(width, round(costume.rotationCenterX))
+    canvas_height, y = get_padding(height, round(costume.rotationCenterY))
+    with Image.open(path) as img:
+        fixed = Image.new("RGBA", (canvas_width, canvas_height), (0, 0, 0, 0))
+        fixed.paste(img, (x, y))
+    path.unlink()
+    fixed.save(path, format=costume.dataFormat, compress_level=compress_level)
+
+
+def fix_center(
+    costume: JSONObject, path: Path, compress_level: int = DEFAULT_COMPRESS_LEVEL
+) -> None:
     if costume.dataFormat == "svg":
         fix_vector_center(costume, path)
     else:
-        fix_bitmap_center(costume, path)
+        fix_bitmap_center(costume, path, compress_level)
+
+
+def fix_centers(
+    costumes: Sequence[tuple[JSONObject, Path]],
+    compress_level: int = DEFAULT_COMPRESS_LEVEL,
+) -> None:
+    threads = min(FIX_THREADS, os.process_cpu_count() or 1, len(costumes))
+    if threads <= 1:
+        for costume, path in costumes:
+            fix_center(costume, path, compress_level)
+        return
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [
+            executor.submit(fix_center, costume, path, compress_level)
+            for costume, path in costumes
+        ]
+        for future in futures:
+            future.result()
@@ -7,5 +7,12 @@ if TYPE_CHECKING:
 PROCCODE_ARG_RE = re.compile(r"\%[sb]")
 
 
+def get_proccode(block: Block) -> str:
+    if block.mutation is None or block.mutation.proccode is None:
+        msg = f"{block.opcode} block has no proccode"
+        raise ValueError(msg)
+    return block.mutation.proccode
+
+
 def get_name(block: Block) -> str:
-    return PROCCODE_ARG_RE.sub("", block.mutation.proccode).strip()
+    return PROCCODE_ARG_RE.sub("", get_proccode(block)).strip()
@@ -1,14 +1,31 @@
-import itertools
 import json
 import shutil
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from enum import StrEnum
 from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any
 from zipfile import ZipFile
 
-from . import costumes
+from . import costumes, dispatch, syntax
 from .decompile_config import decompile_config, write_config
 from .decompile_sprite import Ctx, decompile_sprite
+from .extract import extract_assets
 from .json_object import JSONObject
+from .loader import (
+    iter_targets,
+    load_project_metadata,
+    load_target,
+    load_target_metadata,
+    sort_targets,
+    stage_first,
+)
+from .string_builder import DEFERRED_WIDGET, lay_out_deferred
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterable
+    from concurrent.futures import Executor, Future
 
 
 def get_asset_filename(name: str, md5ext: str) -> str:
@@ -18,50 +35,200 @@ def get_asset_filename(name: str, md5ext: str) -> str:
     return name + Path(md5ext).suffix
 
 
+class AssetNames:
+    # Names asset files into `assets` in the order their targets are added, so
+    # targets can be added as they are read.
+    def __init__(self, assets: dict[str, str]) -> None:
+        self.assets: dict[str, str] = assets
+        self.filenames: dict[str, str] = {}
+
+    def add(self, assets: Iterable[JSONObject]) -> None:
+        for asset in assets:
+            if asset.md5ext in self.assets:
+                continue
+            i = 2
+            filename = get_asset_filename(asset.name, asset.md5ext)
+            while filename in self.filenames:
+                filename = get_asset_filename(f"{asset.name} ({i})", asset.md5ext)
+                i += 1
+            self.assets[asset.md5ext] = filename
+            self.filenames[filename] = asset.md5ext
+
+
 def get_asset_names(project: JSONObject, key: str) -> dict[str, str]:
-    assets: dict[str, str] = {}
-    filenames: dict[str, str] = {}
-    for asset in itertools.chain(*(target._[key] for target in project.targets)):
-        if asset.md5ext in assets:
+    names = AssetNames({})
+    for target in project.targets:
+        names.add(target._[key])
+    return names.assets
+
+
+def read_targets(
+    file: IO[bytes], project: JSONObject, assets: dict[str, str]
+) -> Generator[dict[str, Any]]:
+    # Collects the metadata of each target into `project`, and names its assets
+    # in `assets`, before yielding it.
+    costume_names = AssetNames(assets)
+    sound_names = AssetNames(assets)
+    for target in iter_targets(file):
+        metadata = load_target_metadata(target)
+        project.targets.append(metadata)
+        costume_names.add(metadata.costumes)
+        sound_names.add(metadata.sounds)
+        yield target
+
+
+def fix_costumes(
+    project: JSONObject,
+    assets: dict[str, str],
+    assets_path: Path,
+    compress_level: int = costumes.DEFAULT_COMPRESS_LEVEL,
+) -> None:
+    # Each asset is fixed once, for the first costume that uses it.
+    fixes: dict[str, tuple[JSONObject, Path]] = {}
+    for target in project.targets:
+        if target.isStage:
             continue
-        i = 2
-        filename = get_asset_filename(asset.name, asset.md5ext)
-        while filename in filenames:
-            filename = get_asset_filename(f"{asset.name} ({i})", asset.md5ext)
-            i += 1
-        assets[asset.md5ext] = filename
-        filenames[filename] = asset.md5ext
-    return assets
+        for costume in target.costumes:
+            if costume.md5ext not in fixes:
+                path = assets_path.joinpath(assets[costume.md5ext])
+                fixes[costume.md5ext] = (costume, path)
+    costumes.fix_centers(list(fixes.values()), compress_level)
+
+
+def get_target_path(output: Path, target: dict[str, Any]) -> Path:
+    if target["isStage"]:
+        return output.joinpath("stage.gs")
+    return output.joinpath(f"{target['name']}.gs")
+
+
+def decompile_target(
+    target: dict[str, Any],
+    assets: dict[str, str],
+    identifiers: syntax.Identifiers,
+    path: Path,
+) -> None:
+    dispatch.load_plugins()
+    with path.open("w") as file:
+        ctx = Ctx(load_target(target), assets, identifiers, file)
+        decompile_sprite(ctx)
+        ctx.flush()
+
+
+def get_partial_path(path: Path) -> Path:
+    return path.with_name(path.name + ".part")
 
 
-def decompile(input: Path, output: Path) -> None:
+def decompile_target_deferred(
+    target: dict[str, Any], assets: dict[str, str], path: Path
+) -> list[str]:
+    # Writes code with placeholder identifiers to a partial file next to `path`.
+    identifiers = syntax.DeferredIdentifiers()
+    decompile_target(target, assets, identifiers, get_partial_path(path))
+    return list(identifiers.names)
+
+
+class Pool(StrEnum):
+    PROCESS = "process"
+    THREAD = "thread"
+    INTERPRETER = "interpreter"
+
+
+def create_executor(pool: Pool, jobs: int) -> Executor:
+    if pool == Pool.THREAD:
+        return ThreadPoolExecutor(jobs)
+    if pool == Pool.INTERPRETER:
+        from concurrent.futures import InterpreterPoolExecutor
+
+        return InterpreterPoolExecutor(jobs)
+    return ProcessPoolExecutor(jobs)
+
+
+def decompile_targets_parallel(
+    targets: Iterable[dict[str, Any]],
+    assets: dict[str, str],
+    output: Path,
+    executor: Executor,
+    jobs: int,
+) -> None:
+    # Workers emit placeholder identifiers along with the order in which they
+    # first used each name. Replaying those orders target by target allocates
+    # exactly the identifiers a serial run would have.
+    identifiers = syntax.Identifiers()
+    pending: deque[tuple[Path, Future[list[str]]]] = deque()
+
+    def write_next() -> None:
+        path, future = pending.popleft()
+        substitute = identifiers.resolve(future.result())
+        partial_path = get_partial_path(path)
+        with partial_path.open() as src, path.open("w") as dest:
+            for line in src:
+                if line.startswith(DEFERRED_WIDGET):
+                    dest.write(lay_out_deferred(line, substitute))
+                else:
+                    dest.write(substitute(line))
+        partial_path.unlink()
+
+    for target in targets:
+        path = get_target_path(output, target)
+        pending.append(
+            (path, executor.submit(decompile_target_deferred, target, assets, path))
+        )
+        # Bound the targets held in memory when streaming.
+        if len(pending) >= jobs * 2:
+            write_next()
+    while pending:
+        write_next()
+
+
+def decompile_targets(
+    targets: Iterable[dict[str, Any]],
+    assets: dict[str, str],
+    output: Path,
+    jobs: int,
+    pool: Pool,
+) -> None:
+    if jobs > 1:
+        with create_executor(pool, jobs) as executor:
+            decompile_targets_parallel(targets, assets, output, executor, jobs)
+        return
+    identifiers = syntax.Identifiers()
+    for target in targets:
+        path = get_target_path(output, target)
+        decompile_target(target, assets, identifiers, path)
+
+
+def decompile(  # noqa: PLR0913
+    input: Path,
+    output: Path,
+    *,
+    stream: bool = False,
+    jobs: int = 1,
+    pool: Pool = Pool.PROCESS,
+    store: Path | None = None,
+    compress_level: int = costumes.DEFAULT_COMPRESS_LEVEL,
+) -> None:
     shutil.rmtree(output, ignore_errors=True)
     output.mkdir(parents=True, exist_ok=True)
     assets_path = output.joinpath("assets")
     assets_path.mkdir()
-    with ZipFile(input) as zf, zf.open("project.json") as f:
-        project = json.load(f, object_hook=JSONObject)
-        assets = get_asset_names(project, "costumes")
-        assets.update(get_asset_names(project, "sounds"))
-        for md5ext, name in assets.items():
-            with zf.open(md5ext) as src, assets_path.joinpath(name).open("wb") as dest:
-                shutil.copyfileobj(src, dest)
-    stage = next(target for target in project.targets if target.isStage)
-    sprites = [target for target in project.targets if not target.isStage]
-    ctx = Ctx(stage, assets)
-    with output.joinpath("stage.gs").open("w") as file:
-        decompile_sprite(ctx)
-        file.write(str(ctx))
-    fixed = set()
-    for target in sprites:
-        ctx = Ctx(target, assets)
-        for costume in target.costumes:
-            costumes.fix_center(
-                costume,
-                assets_path.joinpath(assets[costume.md5ext]),
-                fixed,
-            )
-        with output.joinpath(f"{target.name}.gs").open("w") as file:
-            decompile_sprite(ctx)
-            file.write(str(ctx))
+    with ZipFile(input) as zf:
+        if stream:
+            # project.json is read once. Assets are named as their targets are
+            # read, and extracted once every target is decompiled.
+            project = JSONObject({"targets": []})
+            assets: dict[str, str] = {}
+            with zf.open("project.json") as f:
+                targets = stage_first(read_targets(f, project, assets))
+                decompile_targets(targets, assets, output, jobs, pool)
+        else:
+            with zf.open("project.json") as f:
+                data = json.load(f)
+            project = load_project_metadata(data["targets"])
+            assets = get_asset_names(project, "costumes")
+            assets.update(get_asset_names(project, "sounds"))
+            targets = sort_targets(data.pop("targets"))
+            del data
+            decompile_targets(targets, assets, output, jobs, pool)
+        extract_assets(input, zf, assets, assets_path, store)
+        fix_costumes(project, assets, assets_path, compress_level)
     write_config(decompile_config(project), output)
@@ -4,15 +4,17 @@ from .decompile_stmt import decompile_stmt
 
 if TYPE_CHECKING:
     from .decompile_sprite import Ctx
+    from .dispatch import Emitter
 
 
-def decompile_stack(ctx: Ctx, child: str | None) -> None:
+def decompile_stack(ctx: Ctx, child: int | None) -> Emitter:
     if child is None:
         ctx.println("{}")
         return
     ctx.println("{")
     with ctx.indent():
-        while child:
-            decompile_stmt(ctx, ctx.blocks[child])
-            child = ctx.blocks[child].next
+        while child is not None:
+            block = ctx.blocks[child]
+            yield decompile_stmt(ctx, block)
+            child = block.next
     ctx.iprintln("}")
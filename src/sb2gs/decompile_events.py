@@ -1,81 +1,80 @@
-import json
 import logging
 from typing import TYPE_CHECKING
 
-from . import custom_blocks, inputs, syntax
+from . import custom_blocks, dispatch, inputs, syntax
 from .decompile_code import decompile_stack
+from .dispatch import Category
 from .utils import unwrap
 
 if TYPE_CHECKING:
     from ._types import Block
     from .decompile_sprite import Ctx
+    from .dispatch import Emitter
 
 logger = logging.getLogger(__name__)
 
 
-def decompile_event_whenflagclicked(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.EVENT, "event_whenflagclicked")
+def decompile_event_whenflagclicked(ctx: Ctx, block: Block) -> Emitter:
     ctx.iprint("onflag ")
-    decompile_stack(ctx, block.next)
+    yield decompile_stack(ctx, block.next)
 
 
-def decompile_event_whenbroadcastreceived(ctx: Ctx, block: Block) -> None:
-    ctx.iprint("on ", syntax.string(block.fields.BROADCAST_OPTION[0]), " ")
-    decompile_stack(ctx, block.next)
+@dispatch.handler(Category.EVENT, "event_whenbroadcastreceived")
+def decompile_event_whenbroadcastreceived(ctx: Ctx, block: Block) -> Emitter:
+    ctx.iprint("on ", syntax.string(block.fields["BROADCAST_OPTION"][0]), " ")
+    yield decompile_stack(ctx, block.next)
 
 
-def decompile_event_whenkeypressed(ctx: Ctx, block: Block) -> None:
-    ctx.iprint("onkey ", syntax.string(block.fields.KEY_OPTION[0]), " ")
-    decompile_stack(ctx, block.next)
+@dispatch.handler(Category.EVENT, "event_whenkeypressed")
+def decompile_event_whenkeypressed(ctx: Ctx, block: Block) -> Emitter:
+    ctx.iprint("onkey ", syntax.string(block.fields["KEY_OPTION"][0]), " ")
+    yield decompile_stack(ctx, block.next)
 
 
-def decompile_control_start_as_clone(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.EVENT, "control_start_as_clone")
+def decompile_control_start_as_clone(ctx: Ctx, block: Block) -> Emitter:
     ctx.iprint("onclone ")
-    decompile_stack(ctx, block.next)
+    yield decompile_stack(ctx, block.next)
 
 
-def decompile_event_whenthisspriteclicked(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.EVENT, "event_whenthisspriteclicked")
+def decompile_event_whenthisspriteclicked(ctx: Ctx, block: Block) -> Emitter:
     ctx.iprint("onclick ")
-    decompile_stack(ctx, block.next)
+    yield decompile_stack(ctx, block.next)
 
 
-def decompile_procedures_definition(ctx: Ctx, block: Block) -> None:
-    custom = ctx.blocks[unwrap(inputs.block_id(block.inputs.custom_block))]
-    args = json.loads(custom.mutation.argumentnames)
+@dispatch.handler(Category.EVENT, "procedures_definition")
+def decompile_procedures_definition(ctx: Ctx, block: Block) -> Emitter:
+    custom = ctx.blocks[unwrap(inputs.block_id(block.inputs["custom_block"]))]
+    procedure = ctx.index.procedures[custom_blocks.get_proccode(custom)]
     logger.debug("custom block %s", custom)
-    if custom.mutation.warp == "false":
-        ctx.iprint("nowarp proc ")
-    else:
+    if procedure.warp:
         ctx.iprint("proc ")
-    ctx.print(syntax.identifier(custom_blocks.get_name(custom)))
-    if args:
+    else:
+        ctx.iprint("nowarp proc ")
+    ctx.print(ctx.identifier(procedure.name))
+    if procedure.argument_names:
         ctx.print(" ")
-        ctx.commasep(args, lambda arg: ctx.print(syntax.identifier(arg)))
+        ctx.commasep(
+            procedure.argument_names, lambda arg: ctx.print(ctx.identifier(arg))
+        )
     ctx.print(" ")
-    decompile_stack(ctx, block.next)
+    yield decompile_stack(ctx, block.next)
 
 
 def decompile_event(ctx: Ctx, block: Block) -> None:
-    from . import decompile_expr, decompile_stmt
-
-    if decompiler := globals().get(f"decompile_{block.opcode}"):
-        logger.debug("using %s to decompile\n%s", decompiler, block)
-        decompiler(ctx, block)
+    handler = dispatch.handlers.get(block.opcode)
+    if handler and handler.category == Category.EVENT:
+        logger.debug("using %s to decompile\n%s", handler.decompile, block)
+        dispatch.run(handler.decompile(ctx, block))
         return
-    if (
-        block.opcode in decompile_stmt.BLOCKS
-        or block.opcode in decompile_expr.BLOCKS
-        or block.opcode in decompile_expr.OPERATORS
-        or block.opcode in decompile_expr.MENUS
-        or f"decompile_{block.opcode}" in decompile_stmt.__dict__
-        or f"decompile_{block.opcode}" in decompile_expr.__dict__
-    ):
+    # Loose statements and reporters in the workspace are not events.
+    if handler:
         return
     logger.error("no decompiler implemented for event `%s`\n%s", block.opcode, block)
 
 
 def decompile_events(ctx: Ctx) -> None:
-    for block in ctx.blocks.values():
-        if isinstance(block, list):
-            continue
-        if block.topLevel:
-            decompile_event(ctx, block)
+    for block_id in ctx.index.roots:
+        decompile_event(ctx, ctx.blocks[block_id])
@@ -1,17 +1,17 @@
-import contextlib
 import logging
-from copy import deepcopy
 from dataclasses import dataclass
 from enum import StrEnum
 from typing import TYPE_CHECKING
 
-from . import _ast, inputs, syntax
-from ._types import Signature
+from . import _ast, dispatch, inputs, syntax
+from ._types import Input, InputKind, Signature
+from .dispatch import EXPR_CATEGORIES, Category
 from .utils import unwrap
 
 if TYPE_CHECKING:
     from ._types import Block
     from .decompile_sprite import Ctx
+    from .dispatch import Emitter
 
 
 logger = logging.getLogger(__name__)
@@ -24,8 +24,8 @@ MENUS = {
 
 def decompile_menu(ctx: Ctx, block: Block) -> None:
     input_name, is_input = MENUS[block.opcode]
-    data = block.inputs if is_input else block.fields
-    ctx.print(syntax.string(data._[input_name][0]))
+    value = block.inputs[input_name].value if is_input else block.fields[input_name][0]
+    ctx.print(syntax.string(value))
 
 
 class Assoc(StrEnum):
@@ -77,48 +77,51 @@ def is_parenthesis_required(
     return child_op.precedence == parent_op.precedence and parent_op.assoc != assoc
 
 
-def decompile_operand(ctx: Ctx, op_name: str, block: Block, assoc: Assoc) -> None:
+def decompile_operand(ctx: Ctx, op_name: str, block: Block, assoc: Assoc) -> Emitter:
     from .decompile_input import decompile_input
 
     op = OPERATORS[block.opcode]
     parenthesis = False
-    operand_block = block.inputs._.get(op_name)
-    if operand_id := inputs.block_id(operand_block):
+    operand_block = block.inputs.get(op_name)
+    if (operand_id := inputs.block_id(operand_block)) is not None:
         operand_block = ctx.blocks[operand_id]
         operand_op = OPERATORS.get(operand_block.opcode)
         parenthesis = operand_op and is_parenthesis_required(op, operand_op, assoc)
     if parenthesis:
         ctx.print("(")
-    decompile_input(ctx, op_name, block)
+    yield decompile_input(ctx, op_name, block)
     if parenthesis:
         ctx.print(")")
 
 
-def decompile_operator_not(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.OPERATOR, "operator_not")
+def decompile_operator_not(ctx: Ctx, block: Block) -> Emitter:
     ctx.print("not ")
-    decompile_operand(ctx, "OPERAND", block, Assoc.LEFT)
+    yield decompile_operand(ctx, "OPERAND", block, Assoc.LEFT)
 
 
-def decompile_operator_negative(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.OPERATOR, "operator_negative")
+def decompile_operator_negative(ctx: Ctx, block: Block) -> Emitter:
     ctx.print("-")
-    decompile_operand(ctx, "NUM2", block, Assoc.LEFT)
+    yield decompile_operand(ctx, "NUM2", block, Assoc.LEFT)
 
 
-def decompile_operator_letter_of(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.OPERATOR, "operator_letter_of")
+def decompile_operator_letter_of(ctx: Ctx, block: Block) -> Emitter:
     from .decompile_input import decompile_input
 
     op = OPERATORS[block.opcode]
-    decompile_operand(ctx, op.right_name, block, Assoc.LEFT)
+    yield decompile_operand(ctx, op.right_name, block, Assoc.LEFT)
     ctx.print("[")
-    decompile_input(ctx, op.left_name, block)
+    yield decompile_input(ctx, op.left_name, block)
     ctx.print("]")
 
 
-def decompile_binary_operator(ctx: Ctx, block: Block) -> None:
+def decompile_binary_operator(ctx: Ctx, block: Block) -> Emitter:
     op = OPERATORS[block.opcode]
-    decompile_operand(ctx, op.left_name, block, Assoc.LEFT)
+    yield decompile_operand(ctx, op.left_name, block, Assoc.LEFT)
     ctx.print(" ", op.symbol, " ")
-    decompile_operand(ctx, op.right_name, block, Assoc.RIGHT)
+    yield decompile_operand(ctx, op.right_name, block, Assoc.RIGHT)
 
 
 # fmt: off
@@ -201,54 +204,58 @@ del _
 # fmt: on
 
 
-def decompile_block(ctx: Ctx, block: Block) -> None:
-    from .decompile_input import decompile_input
+def decompile_block(ctx: Ctx, block: Block) -> Emitter:
+    from .decompile_input import decompile_inputs
 
-    signature = deepcopy(BLOCKS[block.opcode])
+    signature = BLOCKS[block.opcode]
+    variant = signature.default
     if signature.menu:
         _ast.flatten_menu(ctx, block, signature.menu)
-    if field := block.fields._.get(signature.field or ""):
-        if opcode := unwrap(signature.overloads).get(field[0]):
-            signature.opcode = opcode
-            with contextlib.suppress(ValueError):
-                signature.inputs.remove(unwrap(signature.field))
+    if field := block.fields.get(signature.field or ""):
+        if overload := signature.variants.get(field[0]):
+            variant = overload
         else:
-            block.inputs._[unwrap(signature.field)] = [1, [4, field[0]]]
-    ctx.print(signature.opcode, "(")
-    if signature.inputs:
-        ctx.commasep(signature.inputs, decompile_input, pass_self=True, block=block)
+            block.inputs[unwrap(signature.field)] = Input(InputKind.LITERAL, field[0])
+    ctx.print(variant.opcode, "(")
+    if variant.inputs:
+        yield decompile_inputs(ctx, variant.inputs, block)
     ctx.print(")")
 
 
-def decompile_sensing_of(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.EXPR, "sensing_of")
+def decompile_sensing_of(ctx: Ctx, block: Block) -> Emitter:
     from .decompile_input import decompile_input
 
-    decompile_input(ctx, "OBJECT", block)
-    ctx.print(".", syntax.string(block.fields.PROPERTY[0]))
+    yield decompile_input(ctx, "OBJECT", block)
+    ctx.print(".", syntax.string(block.fields["PROPERTY"][0]))
 
 
-def decompile_data_itemoflist(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.EXPR, "data_itemoflist")
+def decompile_data_itemoflist(ctx: Ctx, block: Block) -> Emitter:
     from .decompile_input import decompile_input
 
-    ctx.print(syntax.identifier(block.fields.LIST[0]), "[")
-    decompile_input(ctx, "INDEX", block)
+    ctx.print(ctx.identifier(block.fields["LIST"][0]), "[")
+    yield decompile_input(ctx, "INDEX", block)
     ctx.print("]")
 
 
-def decompile_data_itemnumoflist(ctx: Ctx, block: Block) -> None:
-    decompile_operand(ctx, "ITEM", block, Assoc.LEFT)
-    ctx.print(" in ", syntax.identifier(block.fields.LIST[0]))
+@dispatch.handler(Category.OPERATOR, "data_itemnumoflist")
+def decompile_data_itemnumoflist(ctx: Ctx, block: Block) -> Emitter:
+    yield decompile_operand(ctx, "ITEM", block, Assoc.LEFT)
+    ctx.print(" in ", ctx.identifier(block.fields["LIST"][0]))
 
 
+@dispatch.handler(Category.EXPR, "data_lengthoflist")
 def decompile_data_lengthoflist(ctx: Ctx, block: Block) -> None:
-    ctx.print("length(", syntax.identifier(block.fields.LIST[0]), ")")
+    ctx.print("length(", ctx.identifier(block.fields["LIST"][0]), ")")
 
 
+@dispatch.handler(
+    Category.EXPR, "argument_reporter_string_number", "argument_reporter_boolean"
+)
 def decompile_argument_reporter_string_number(ctx: Ctx, block: Block) -> None:
-    ctx.print("$", syntax.identifier(block.fields.VALUE[0]))
-
+    ctx.print("$", ctx.identifier(block.fields["VALUE"][0]))
 
-decompile_argument_reporter_boolean = decompile_argument_reporter_string_number
 
 UNREAL_OPCODES = {
     "operator_letter_of",
@@ -258,17 +265,18 @@ UNREAL_OPCODES = {
 }
 
 
-def decompile_expr(ctx: Ctx, block: Block) -> None:
-    if block.opcode in MENUS:
-        decompiler = decompile_menu
-    elif block.opcode in OPERATORS and block.opcode not in UNREAL_OPCODES:
-        decompiler = decompile_binary_operator
-    elif block.opcode in BLOCKS:
-        decompiler = decompile_block
-    else:
-        decompiler = globals().get(f"decompile_{block.opcode}")
-    if decompiler:
-        logger.debug("using %s to decompile\n%s", decompiler, block)
-        decompiler(ctx, block)
-        return
+for opcode in MENUS:
+    dispatch.register(opcode, Category.MENU, decompile_menu)
+for opcode in OPERATORS.keys() - UNREAL_OPCODES:
+    dispatch.register(opcode, Category.OPERATOR, decompile_binary_operator)
+for opcode in BLOCKS:
+    dispatch.register(opcode, Category.EXPR, decompile_block)
+
+
+def decompile_expr(ctx: Ctx, block: Block) -> Emitter | None:
+    handler = dispatch.handlers.get(block.opcode)
+    if handler and handler.category in EXPR_CATEGORIES:
+        logger.debug("using %s to decompile\n%s", handler.decompile, block)
+        return handler.decompile(ctx, block)
     logger.error("no decompiler implemented for expr `%s`\n%s", block.opcode, block)
+    return None
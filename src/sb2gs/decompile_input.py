@@ -1,29 +1,50 @@
 import logging
 from typing import TYPE_CHECKING
 
-from . import inputs, syntax
-from ._types import InputType
+from . import formatter, syntax
+from ._types import EMPTY_INPUT, InputKind
 from .decompile_expr import decompile_expr
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
     from ._types import Block
     from .decompile_sprite import Ctx
+    from .dispatch import Emitter
 
 logger = logging.getLogger(__name__)
 
 
-def decompile_input(ctx: Ctx, input_name: str, block: Block) -> None:
-    input = block.inputs._.get(input_name)
-    if input is None or input == [1, None]:
+def decompile_input(ctx: Ctx, input_name: str, block: Block) -> Emitter | None:
+    input = block.inputs.get(input_name, EMPTY_INPUT)
+    kind = input.kind
+    if kind is InputKind.BLOCK:
+        return decompile_expr(ctx, ctx.blocks[input.value])
+    if kind is InputKind.EMPTY:
         ctx.print("false")
-        return
-    if block_id := inputs.block_id(input):
-        decompile_expr(ctx, ctx.blocks[block_id])
-        return
-    input_type = InputType(input[1][0])
-    input_value = input[1][1]
-    assert isinstance(input_value, (str, int, float))
-    if input_type in {InputType.VAR, InputType.LIST}:
-        ctx.print(syntax.identifier(input_value))
-        return
-    ctx.print(syntax.value(input_value))
+    elif kind is InputKind.VARIABLE or kind is InputKind.LIST:
+        ctx.print(ctx.identifier(input.value))
+    else:
+        ctx.print(syntax.value(input.value))
+    return None
+
+
+def decompile_inputs(ctx: Ctx, input_names: Sequence[str], block: Block) -> Emitter:
+    for i, input_name in enumerate(input_names):
+        if i != 0:
+            ctx.print(", ")
+        yield decompile_input(ctx, input_name, block)
+
+
+def decompile_arguments(
+    ctx: Ctx, opening: str, input_names: Sequence[str], block: Block
+) -> Emitter:
+    # Emits `opening arg, ...;` as a statement, wrapped one argument per line if
+    # it does not fit on one.
+    arguments: list[str] = []
+    for input_name in input_names:
+        with ctx.capture() as strings:
+            yield decompile_input(ctx, input_name, block)
+        arguments.append("".join(strings))
+    ctx.iprint_widget(formatter.Block(opening + " ", ";", arguments))
+    ctx.println()
@@ -1,26 +1,42 @@
+import json
 import logging
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-from . import _ast, syntax
+from . import _ast, formatter, syntax
 from .decompile_events import decompile_events
 from .string_builder import StringBuilder
 
 if TYPE_CHECKING:
-    from ._types import Block
+    from collections.abc import Callable, Generator
+    from typing import TextIO
+
+    from ._types import Block, Index
+    from .formatter import Measure
     from .json_object import JSONObject
 logger = logging.getLogger(__name__)
 
 
 class Ctx(StringBuilder):
-    def __init__(self, target: JSONObject, assets: dict[str, str]) -> None:
-        super().__init__()
+    def __init__(
+        self,
+        target: JSONObject,
+        assets: dict[str, str],
+        identifiers: syntax.Identifiers,
+        file: TextIO | None = None,
+    ) -> None:
+        super().__init__(file=file)
+        self.identifier: Callable[[str], str] = identifiers.identifier
+        self.measure: Measure = identifiers.measure
+        self.deferred: bool = identifiers.deferred
         self.is_stage: bool = target.isStage
         self.costumes: list[JSONObject] = target.costumes
         self.sounds: list[JSONObject] = target.sounds
         self.variables: JSONObject = target.variables
         self.lists: JSONObject = target.lists
-        self.blocks: dict[str, Block] = target.blocks._
+        self.blocks: list[Block] = target.blocks
+        self.index: Index = target.index
+        self.structures: list[int | None] = []
         self.volume: float = target.volume
         self.assets: dict[str, str] = assets
         if not self.is_stage:
@@ -33,25 +49,84 @@ class Ctx(StringBuilder):
             self.rotation_style: str = target.rotationStyle
 
 
-def decompile_constexpr(ctx: Ctx, value: object) -> None:
+def constexpr(value: object) -> str:
     if type(value) is bool:
-        ctx.print('"true"' if value else '"false"')
-        return
+        return '"true"' if value else '"false"'
     if isinstance(value, int | float):
-        ctx.print(syntax.number(value))
-        return
+        return syntax.number(value)
     if isinstance(value, str):
-        ctx.print(syntax.string(value))
-        return
+        return syntax.string(value)
     msg = f"Unsupported value {value!r}"
     raise ValueError(msg)
 
 
-def decompile_asset(ctx: Ctx, asset: JSONObject) -> None:
+def decompile_constexpr(ctx: Ctx, value: object) -> None:
+    ctx.print(constexpr(value))
+
+
+# List initializers are serialized this many items at a time.
+LIST_CHUNK_SIZE = 4096
+# json.dumps writes these exactly as constexpr does.
+BULK_TYPES = {str, int, float}
+# Joins the items json.dumps writes, so they can be split apart again. It never
+# occurs inside an item, as json.dumps escapes control characters.
+ITEM_SEPARATOR = "\x00"
+
+
+def list_chunks(values: list[object]) -> Generator[list[str]]:
+    for start in range(0, len(values), LIST_CHUNK_SIZE):
+        chunk = values[start : start + LIST_CHUNK_SIZE]
+        if set(map(type, chunk)) <= BULK_TYPES:
+            text = json.dumps(chunk, separators=(ITEM_SEPARATOR, ": "))
+            yield text[1:-1].split(ITEM_SEPARATOR)
+        else:
+            yield list(map(constexpr, chunk))
+
+
+def decompile_list(ctx: Ctx, name: str, values: list[object]) -> None:
+    # Writes the list a chunk at a time, laid out as `formatter.expand` would.
+    # Items are held back only until a lower bound on the list's width shows
+    # that it must be wrapped, which is within a line or so of items.
+    opening = f"list {name} = ["
+    closing = "];"
+    max_width = formatter.MAX_WIDTH - len(ctx.prefix)
+    width = ctx.measure(opening) + len(closing) - 2
+    held: list[str] = []
+    expanded = False
+    for chunk in list_chunks(values):
+        items = chunk
+        if not expanded:
+            held.extend(chunk)
+            width += sum(map(len, chunk)) + 2 * len(chunk)
+            if width <= max_width or len(held) < 2:
+                continue
+            expanded = True
+            items = held
+            ctx.iprintln(opening.rstrip())
+        indent = ctx.prefix + formatter.INDENT
+        ctx.print(indent, (",\n" + indent).join(items), ",\n")
+        ctx.flush()
+    if expanded:
+        ctx.iprintln(closing)
+    else:
+        ctx.iprint_widget(formatter.Block(opening, closing, held))
+        ctx.println()
+
+
+def asset_item(ctx: Ctx, asset: JSONObject) -> str:
     name = ctx.assets[asset.md5ext]
-    ctx.print(syntax.string("assets/" + name))
+    text = syntax.string("assets/" + name)
     if Path(name).stem != asset.name:
-        ctx.print(" as ", syntax.string(asset.name))
+        text += " as " + syntax.string(asset.name)
+    return text
+
+
+def decompile_assets(ctx: Ctx, keyword: str, assets: list[JSONObject]) -> None:
+    if not assets:
+        return
+    items = [asset_item(ctx, asset) for asset in assets]
+    ctx.iprint_widget(formatter.Block(keyword + " ", ";", items))
+    ctx.println()
 
 
 def decompile_common_properties(ctx: Ctx) -> None:
@@ -96,37 +171,27 @@ def decompile_properties(ctx: Ctx) -> None:
 
 
 def decompile_costumes(ctx: Ctx) -> None:
-    if not ctx.costumes:
-        return
-    ctx.iprint("costumes ")
-    ctx.commasep(ctx.costumes, decompile_asset, pass_self=True)
-    ctx.println(";")
+    decompile_assets(ctx, "costumes", ctx.costumes)
 
 
 def decompile_sounds(ctx: Ctx) -> None:
-    if not ctx.sounds:
-        return
-    ctx.iprint("sounds ")
-    ctx.commasep(ctx.sounds, decompile_asset, pass_self=True)
-    ctx.println(";")
+    decompile_assets(ctx, "sounds", ctx.sounds)
 
 
 def decompile_variables(ctx: Ctx) -> None:
     for variable_name, variable_value, *_ in ctx.variables._.values():
-        ctx.iprint("var ", syntax.identifier(variable_name), " = ")
+        ctx.iprint("var ", ctx.identifier(variable_name), " = ")
         decompile_constexpr(ctx, variable_value)
         ctx.println(";")
 
 
 def decompile_lists(ctx: Ctx) -> None:
     for list_name, list_values in ctx.lists._.values():
-        ctx.iprint("list ", syntax.identifier(list_name))
+        name = ctx.identifier(list_name)
         if not list_values:
-            ctx.println(";")
+            ctx.iprintln("list ", name, ";")
             continue
-        ctx.print(" = [")
-        ctx.commasep(list_values, decompile_constexpr, pass_self=True)
-        ctx.println("];")
+        decompile_list(ctx, name, list_values)
 
 
 def decompile_sprite(ctx: Ctx) -> None:
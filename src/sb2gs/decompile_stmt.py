@@ -1,17 +1,15 @@
-import contextlib
-import json
 import logging
-from copy import deepcopy
 from typing import TYPE_CHECKING
 
-from . import _ast, custom_blocks, inputs, syntax
-from ._types import Block, Signature
-from .decompile_input import decompile_input
-from .json_object import JSONObject
+from . import _ast, custom_blocks, dispatch, inputs
+from ._types import Block, Input, InputKind, Signature
+from .decompile_input import decompile_arguments, decompile_input
+from .dispatch import Category
 from .utils import unwrap
 
 if TYPE_CHECKING:
     from .decompile_sprite import Ctx
+    from .dispatch import Emitter
 
 logger = logging.getLogger(__name__)
 
@@ -172,22 +170,20 @@ del _
 # fmt: on
 
 
-def decompile_block(ctx: Ctx, block: Block) -> None:
-    signature = deepcopy(BLOCKS[block.opcode])
+def decompile_block(ctx: Ctx, block: Block) -> Emitter:
+    signature = BLOCKS[block.opcode]
+    variant = signature.default
     if signature.menu:
         _ast.flatten_menu(ctx, block, signature.menu)
-    if field := block.fields._.get(signature.field or ""):
-        if opcode := unwrap(signature.overloads).get(field[0]):
-            signature.opcode = opcode
-            with contextlib.suppress(ValueError):
-                signature.inputs.remove(unwrap(signature.field))
+    if field := block.fields.get(signature.field or ""):
+        if overload := signature.variants.get(field[0]):
+            variant = overload
         else:
-            block.inputs._[unwrap(signature.field)] = [1, [4, field[0]]]
-    ctx.iprint(signature.opcode)
-    if signature.inputs:
-        ctx.print(" ")
-        ctx.commasep(signature.inputs, decompile_input, pass_self=True, block=block)
-    ctx.println(";")
+            block.inputs[unwrap(signature.field)] = Input(InputKind.LITERAL, field[0])
+    if variant.inputs:
+        yield decompile_arguments(ctx, variant.opcode, variant.inputs, block)
+    else:
+        ctx.iprintln(variant.opcode, ";")
 
 
 ADDONS = {
@@ -198,173 +194,191 @@ ADDONS = {
 }
 
 
-def decompile_addon(ctx: Ctx, block: Block) -> None:
-    opcode, inputs = ADDONS[block.mutation.proccode]
-    ctx.iprint(opcode)
+def decompile_addon(ctx: Ctx, block: Block) -> Emitter:
+    opcode, inputs = ADDONS[custom_blocks.get_proccode(block)]
     if inputs:
-        ctx.print(" ")
-        ctx.commasep(inputs, decompile_input, pass_self=True, block=block)
-    ctx.println(";")
+        yield decompile_arguments(ctx, opcode, inputs, block)
+    else:
+        ctx.iprintln(opcode, ";")
 
 
-def decompile_else(ctx: Ctx, block_id: str | None) -> None:
+def decompile_else(ctx: Ctx, block_id: int | None) -> Emitter:
     from .decompile_code import decompile_stack
 
-    if block_id is None:
-        return
-    block = ctx.blocks[block_id]
-    if block.opcode.startswith("control_if") and block.next is None:
+    while block_id is not None:
+        block = ctx.blocks[block_id]
+        if not (block.opcode.startswith("control_if") and block.next is None):
+            ctx.iprint("else ")
+            yield decompile_stack(ctx, block_id)
+            return
         ctx.iprint("elif ")
-        decompile_input(ctx, "CONDITION", block)
+        yield decompile_input(ctx, "CONDITION", block)
         ctx.print(" ")
-        decompile_stack(ctx, inputs.block_id(block.inputs._.get("SUBSTACK")))
-        decompile_else(ctx, inputs.block_id(block.inputs._.get("SUBSTACK2")))
-    else:
-        ctx.iprint("else ")
-        decompile_stack(ctx, block_id)
+        yield decompile_stack(ctx, inputs.block_id(block.inputs.get("SUBSTACK")))
+        block_id = inputs.block_id(block.inputs.get("SUBSTACK2"))
 
 
-def decompile_control_if(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.STMT, "control_if", "control_if_else")
+def decompile_control_if(ctx: Ctx, block: Block) -> Emitter:
     from .decompile_code import decompile_stack
 
     ctx.iprint("if ")
-    decompile_input(ctx, "CONDITION", block)
+    yield decompile_input(ctx, "CONDITION", block)
     ctx.print(" ")
-    decompile_stack(ctx, inputs.block_id(block.inputs._.get("SUBSTACK")))
-    decompile_else(ctx, inputs.block_id(block.inputs._.get("SUBSTACK2")))
+    yield decompile_stack(ctx, inputs.block_id(block.inputs.get("SUBSTACK")))
+    yield decompile_else(ctx, inputs.block_id(block.inputs.get("SUBSTACK2")))
 
 
-def decompile_control_repeat(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.STMT, "control_repeat")
+def decompile_control_repeat(ctx: Ctx, block: Block) -> Emitter:
     from .decompile_code import decompile_stack
 
     ctx.iprint("repeat ")
-    decompile_input(ctx, "TIMES", block)
+    yield decompile_input(ctx, "TIMES", block)
     ctx.print(" ")
-    decompile_stack(ctx, inputs.block_id(block.inputs._.get("SUBSTACK")))
+    yield decompile_stack(ctx, inputs.block_id(block.inputs.get("SUBSTACK")))
 
 
-def decompile_control_repeat_until(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.STMT, "control_repeat_until", "control_wait_until")
+def decompile_control_repeat_until(ctx: Ctx, block: Block) -> Emitter:
     from .decompile_code import decompile_stack
 
     ctx.iprint("until ")
-    decompile_input(ctx, "CONDITION", block)
+    yield decompile_input(ctx, "CONDITION", block)
     ctx.print(" ")
-    decompile_stack(ctx, inputs.block_id(block.inputs._.get("SUBSTACK")))
+    yield decompile_stack(ctx, inputs.block_id(block.inputs.get("SUBSTACK")))
 
 
-def decompile_control_forever(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.STMT, "control_forever")
+def decompile_control_forever(ctx: Ctx, block: Block) -> Emitter:
     from .decompile_code import decompile_stack
 
     ctx.iprint("forever ")
-    decompile_stack(ctx, inputs.block_id(block.inputs._.get("SUBSTACK")))
+    yield decompile_stack(ctx, inputs.block_id(block.inputs.get("SUBSTACK")))
 
 
-def decompile_control_while(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.STMT, "control_while")
+def decompile_control_while(ctx: Ctx, block: Block) -> Emitter:
     from .decompile_code import decompile_stack
     from .decompile_expr import Assoc, decompile_operand
 
-    condition = inputs.block_id(block.inputs._.get("CONDITION"))
+    condition = inputs.block_id(block.inputs.get("CONDITION"))
 
-    if condition:
+    if condition is not None:
         ctx.iprint("until not ")
-        decompile_operand(
+        yield decompile_operand(
             ctx,
             "OPERAND",
-            Block("operator_not", inputs=JSONObject({"OPERAND": [2, condition]})),
+            Block(
+                "operator_not", inputs={"OPERAND": Input(InputKind.BLOCK, condition)}
+            ),
             Assoc.LEFT,
         )
         ctx.print(" ")
     else:
         ctx.iprint("until not true ")
-    decompile_stack(ctx, inputs.block_id(block.inputs._.get("SUBSTACK")))
+    yield decompile_stack(ctx, inputs.block_id(block.inputs.get("SUBSTACK")))
 
 
-def decompile_procedures_call(ctx: Ctx, block: Block) -> None:
-    ctx.iprint(syntax.identifier(custom_blocks.get_name(block)))
-    args = json.loads(block.mutation.argumentids)
-    if args:
-        ctx.print(" ")
-        ctx.commasep(args, decompile_input, pass_self=True, block=block)
-    ctx.println(";")
+@dispatch.handler(Category.STMT, "procedures_call")
+def decompile_procedures_call(ctx: Ctx, block: Block) -> Emitter:
+    procedure = ctx.index.procedures[custom_blocks.get_proccode(block)]
+    name = ctx.identifier(procedure.name)
+    if procedure.argument_ids:
+        yield decompile_arguments(ctx, name, procedure.argument_ids, block)
+    else:
+        ctx.iprintln(name, ";")
 
 
-def decompile_data_setvariableto(ctx: Ctx, block: Block) -> None:
-    ctx.iprint(syntax.identifier(block.fields.VARIABLE[0]), " = ")
-    decompile_input(ctx, "VALUE", block)
+@dispatch.handler(Category.STMT, "data_setvariableto")
+def decompile_data_setvariableto(ctx: Ctx, block: Block) -> Emitter:
+    ctx.iprint(ctx.identifier(block.fields["VARIABLE"][0]), " = ")
+    yield decompile_input(ctx, "VALUE", block)
     ctx.println(";")
 
 
-def decompile_data_changevariableby(ctx: Ctx, block: Block) -> None:
-    op = block._.get("OPERATOR", "+")
-    ctx.iprint(syntax.identifier(block.fields.VARIABLE[0]), f" {op}= ")
-    decompile_input(ctx, "VALUE", block)
+@dispatch.handler(Category.STMT, "data_changevariableby")
+def decompile_data_changevariableby(ctx: Ctx, block: Block) -> Emitter:
+    op = block.operator or "+"
+    ctx.iprint(ctx.identifier(block.fields["VARIABLE"][0]), f" {op}= ")
+    yield decompile_input(ctx, "VALUE", block)
     ctx.println(";")
 
 
+@dispatch.handler(Category.STMT, "data_showvariable")
 def decompile_data_showvariable(ctx: Ctx, block: Block) -> None:
-    ctx.iprintln("show ", syntax.identifier(block.fields.VARIABLE[0]), ";")
+    ctx.iprintln("show ", ctx.identifier(block.fields["VARIABLE"][0]), ";")
 
 
+@dispatch.handler(Category.STMT, "data_hidevariable")
 def decompile_data_hidevariable(ctx: Ctx, block: Block) -> None:
-    ctx.iprintln("hide ", syntax.identifier(block.fields.VARIABLE[0]), ";")
+    ctx.iprintln("hide ", ctx.identifier(block.fields["VARIABLE"][0]), ";")
 
 
-def decompile_data_addtolist(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.STMT, "data_addtolist")
+def decompile_data_addtolist(ctx: Ctx, block: Block) -> Emitter:
     ctx.iprint("add ")
-    decompile_input(ctx, "ITEM", block)
-    ctx.println(" to ", syntax.identifier(block.fields.LIST[0]), ";")
+    yield decompile_input(ctx, "ITEM", block)
+    ctx.println(" to ", ctx.identifier(block.fields["LIST"][0]), ";")
 
 
-def decompile_data_deleteoflist(ctx: Ctx, block: Block) -> None:
-    ctx.print("delete ", syntax.identifier(block.fields.LIST[0]), "[")
-    decompile_input(ctx, "INDEX", block)
+@dispatch.handler(Category.STMT, "data_deleteoflist")
+def decompile_data_deleteoflist(ctx: Ctx, block: Block) -> Emitter:
+    ctx.print("delete ", ctx.identifier(block.fields["LIST"][0]), "[")
+    yield decompile_input(ctx, "INDEX", block)
     ctx.println("];")
 
 
+@dispatch.handler(Category.STMT, "data_deletealloflist")
 def decompile_data_deletealloflist(ctx: Ctx, block: Block) -> None:
     ctx.iprint("delete ")
-    ctx.print(syntax.identifier(block.fields.LIST[0]))
+    ctx.print(ctx.identifier(block.fields["LIST"][0]))
     ctx.println(";")
 
 
-def decompile_data_insertatlist(ctx: Ctx, block: Block) -> None:
+@dispatch.handler(Category.STMT, "data_insertatlist")
+def decompile_data_insertatlist(ctx: Ctx, block: Block) -> Emitter:
     ctx.iprint("insert ")
-    decompile_input(ctx, "ITEM", block)
-    ctx.print(" at ", syntax.identifier(block.fields.LIST[0]), "[")
-    decompile_input(ctx, "INDEX", block)
+    yield decompile_input(ctx, "ITEM", block)
+    ctx.print(" at ", ctx.identifier(block.fields["LIST"][0]), "[")
+    yield decompile_input(ctx, "INDEX", block)
     ctx.println("];")
 
 
-def decompile_data_replaceitemoflist(ctx: Ctx, block: Block) -> None:
-    ctx.iprint(syntax.identifier(block.fields.LIST[0]), "[")
-    decompile_input(ctx, "INDEX", block)
-    op = block._.get("OPERATOR", "")
+@dispatch.handler(Category.STMT, "data_replaceitemoflist")
+def decompile_data_replaceitemoflist(ctx: Ctx, block: Block) -> Emitter:
+    ctx.iprint(ctx.identifier(block.fields["LIST"][0]), "[")
+    yield decompile_input(ctx, "INDEX", block)
+    op = block.operator or ""
     ctx.print(f"] {op}= ")
-    decompile_input(ctx, "ITEM", block)
+    yield decompile_input(ctx, "ITEM", block)
     ctx.println(";")
 
 
+@dispatch.handler(Category.STMT, "data_showlist")
 def decompile_data_showlist(ctx: Ctx, block: Block) -> None:
-    ctx.iprintln("show ", syntax.identifier(block.fields.LIST[0]), ";")
+    ctx.iprintln("show ", ctx.identifier(block.fields["LIST"][0]), ";")
 
 
+@dispatch.handler(Category.STMT, "data_hidelist")
 def decompile_data_hidelist(ctx: Ctx, block: Block) -> None:
-    ctx.iprintln("hide ", syntax.identifier(block.fields.LIST[0]), ";")
+    ctx.iprintln("hide ", ctx.identifier(block.fields["LIST"][0]), ";")
 
 
-decompile_control_wait_until = decompile_control_repeat_until
-decompile_control_if_else = decompile_control_if
+for opcode in BLOCKS:
+    dispatch.register(opcode, Category.STMT, decompile_block)
 
 
-def decompile_stmt(ctx: Ctx, block: Block) -> None:
-    if (mutation := block._.get("mutation")) and mutation._.get("proccode") in ADDONS:
+def decompile_stmt(ctx: Ctx, block: Block) -> Emitter | None:
+    handler = dispatch.handlers.get(block.opcode)
+    if (mutation := block.mutation) and mutation.proccode in ADDONS:
         decompiler = decompile_addon
-    elif block.opcode in BLOCKS:
-        decompiler = decompile_block
+    elif handler and handler.category == Category.STMT:
+        decompiler = handler.decompile
     else:
-        decompiler = globals().get(f"decompile_{block.opcode}")
+        decompiler = None
     if decompiler:
         logger.debug("using %s to decompile\n%s", decompiler, block)
-        decompiler(ctx, block)
-        return
+        return decompiler(ctx, block)
     logger.error("no decompiler implemented for stmt `%s`\n%s", block.opcode, block)
+    return None
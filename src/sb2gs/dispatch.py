@@ -0,0 +1,77 @@
+import functools
+import logging
+from dataclasses import dataclass
+from enum import StrEnum
+from importlib.metadata import entry_points
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator
+
+    from ._types import Block
+    from .decompile_sprite import Ctx
+
+logger = logging.getLogger(__name__)
+
+
+# Decompilers that emit nested blocks are generators that yield the emitters of
+# those blocks instead of calling them, and `run` drives them all on one explicit
+# stack. This keeps the Python stack flat however deeply scripts are nested.
+# Decompilers without nested blocks may be plain functions returning None.
+type Emitter = Generator[Emitter | None]
+type Decompiler = Callable[[Ctx, Block], Emitter | None]
+
+
+class Category(StrEnum):
+    STMT = "stmt"
+    EXPR = "expr"
+    EVENT = "event"
+    MENU = "menu"
+    OPERATOR = "operator"
+
+
+EXPR_CATEGORIES = {Category.EXPR, Category.MENU, Category.OPERATOR}
+
+
+@dataclass(frozen=True, slots=True)
+class Handler:
+    decompile: Decompiler
+    category: Category
+
+
+handlers: dict[str, Handler] = {}
+
+
+def register(opcode: str, category: Category, decompile: Decompiler) -> None:
+    handlers[opcode] = Handler(decompile, category)
+
+
+def handler(category: Category, *opcodes: str) -> Callable[[Decompiler], Decompiler]:
+    def decorator(func: Decompiler) -> Decompiler:
+        for opcode in opcodes:
+            register(opcode, category, func)
+        return func
+
+    return decorator
+
+
+def run(emitter: Emitter | None) -> None:
+    if emitter is None:
+        return
+    stack = [emitter]
+    while stack:
+        try:
+            child = next(stack[-1])
+        except StopIteration:
+            stack.pop()
+            continue
+        if child is not None:
+            stack.append(child)
+
+
+@functools.cache
+def load_plugins() -> None:
+    # Plugins register their handlers when their entry point is loaded.
+    for entry_point in entry_points(group="sb2gs.plugins"):
+        logger.info("loading plugin %s", entry_point.value)
+        entry_point.load()
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from .extract import get_store_path
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 1 << 30
+
+
+@dataclass
+class DownloadCache:
+    # Assets are immutable and named by their md5, so they are kept as long as
+    # there is room. Project JSON is kept with the modification time reported by
+    # the API, and is only reused while that is unchanged. Files are touched
+    # when used, and the least recently used are evicted first.
+    root: Path
+    max_size: int = DEFAULT_CACHE_SIZE
+
+    def get_asset_path(self, md5ext: str) -> Path:
+        return get_store_path(self.root.joinpath("assets"), md5ext)
+
+    def get_project_path(self, id: str) -> Path:
+        return self.root.joinpath("projects", f"{id}.json")
+
+    def write(self, path: Path, content: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.{os.getpid()}.part")
+        partial.write_bytes(content)
+        partial.replace(path)
+
+    def get_asset(self, md5ext: str) -> bytes | None:
+        path = self.get_asset_path(md5ext)
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        if hashlib.md5(content).hexdigest() != path.stem:  # noqa: S324
+            logger.warning("Cached %s does not match its hash, removing it", md5ext)
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)
+        return content
+
+    def add_asset(self, md5ext: str, content: bytes) -> None:
+        path = self.get_asset_path(md5ext)
+        if hashlib.md5(content).hexdigest() != path.stem:  # noqa: S324
+            logger.warning("%s does not match its hash, not caching it", md5ext)
+            return
+        self.write(path, content)
+
+    def get_project(self, id: str, modified: str | None) -> dict[str, Any] | None:
+        if modified is None:
+            return None
+        path = self.get_project_path(id)
+        try:
+            entry = json.loads(path.read_bytes())
+            entry_modified, project = entry["modified"], entry["project"]
+        except FileNotFoundError:
+            return None
+        except OSError, ValueError, KeyError, TypeError:
+            logger.warning("Cached project %s is corrupt, removing it", id)
+            path.unlink(missing_ok=True)
+            return None
+        if entry_modified != modified:
+            return None
+        os.utime(path)
+        return project
+
+    def add_project(self, id: str, modified: str | None, data: dict[str, Any]) -> None:
+        if modified is None:
+            return
+        entry = {"modified": modified, "project": data}
+        self.write(self.get_project_path(id), json.dumps(entry).encode())
+
+    def evict(self) -> None:
+        # Partial files may still be being written by another process, and are
+        # neither counted nor removed.
+        files = []
+        total = 0
+        for path in self.root.rglob("*"):
+            if path.suffix != ".part" and path.is_file():
+                stat = path.stat()
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_size:
+            return
+        files.sort()
+        for _, size, path in files:
+            path.unlink(missing_ok=True)
+            total -= size
+            if total <= self.max_size:
+                break
@@ -0,0 +1,173 @@
+import functools
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import batched
+from typing import TYPE_CHECKING, BinaryIO
+from zipfile import ZIP_STORED, BadZipFile, ZipFile
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from pathlib import Path
+    from zipfile import ZipInfo
+
+logger = logging.getLogger(__name__)
+
+# Assets are copied out of the archive by up to this many threads, each with its
+# own handles on the archive. Decompressing and copying both release the GIL.
+EXTRACT_THREADS = 8
+COPY_SIZE = 1 << 20
+# Fixed part of a local file header, followed by the file name and extra field.
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+FLAG_ENCRYPTED = 0x1
+# ioctl that makes a file share the extents of another, on Linux filesystems
+# with copy-on-write such as btrfs and XFS.
+FICLONE = 0x40049409
+
+type Entry = tuple[ZipInfo, Path]
+
+
+def get_data_offset(file: BinaryIO, info: ZipInfo) -> int:
+    file.seek(info.header_offset)
+    header = LOCAL_HEADER.unpack(file.read(LOCAL_HEADER.size))
+    if header[0] != LOCAL_HEADER_SIGNATURE:
+        msg = f"Bad local file header for {info.filename!r}"
+        raise BadZipFile(msg)
+    name_length, extra_length = header[-2:]
+    return info.header_offset + LOCAL_HEADER.size + name_length + extra_length
+
+
+def copy_range(src: BinaryIO, dest: BinaryIO, offset: int, size: int) -> None:
+    if hasattr(os, "copy_file_range"):
+        try:
+            while size > 0:
+                copied = os.copy_file_range(
+                    src.fileno(), dest.fileno(), size, offset_src=offset
+                )
+                if copied == 0:
+                    break
+                offset += copied
+                size -= copied
+        except OSError:
+            # Not supported between these files, e.g. on older kernels.
+            pass
+    src.seek(offset)
+    while size > 0:
+        chunk = src.read(min(size, COPY_SIZE))
+        if not chunk:
+            msg = "Unexpected end of archive"
+            raise BadZipFile(msg)
+        dest.write(chunk)
+        size -= len(chunk)
+
+
+def is_raw_copyable(info: ZipInfo) -> bool:
+    return (
+        info.compress_type == ZIP_STORED
+        and not info.flag_bits & FLAG_ENCRYPTED
+        and info.compress_size == info.file_size
+    )
+
+
+def extract_entries(input: Path, entries: Sequence[Entry]) -> None:
+    with ZipFile(input) as zf, input.open("rb") as raw:
+        for info, path in entries:
+            with path.open("wb") as dest:
+                if is_raw_copyable(info):
+                    offset = get_data_offset(raw, info)
+                    copy_range(raw, dest, offset, info.file_size)
+                else:
+                    with zf.open(info) as src:
+                        shutil.copyfileobj(src, dest, COPY_SIZE)
+
+
+def extract_entries_parallel(input: Path, entries: Sequence[Entry]) -> None:
+    # Each thread takes a run of entries in archive order, so reads stay mostly
+    # sequential.
+    entries = sorted(entries, key=lambda entry: entry[0].header_offset)
+    threads = min(EXTRACT_THREADS, os.process_cpu_count() or 1, len(entries))
+    if threads <= 1:
+        extract_entries(input, entries)
+        return
+    batches = batched(entries, -(-len(entries) // threads), strict=False)
+    extract = functools.partial(extract_entries, input)
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(extract, batches))
+
+
+def get_store_path(store: Path, md5ext: str) -> Path:
+    return store.joinpath(md5ext[:2], md5ext)
+
+
+def add_to_store(path: Path, stored: Path) -> bool:
+    # Publishes an extracted file under its hash. Renaming is atomic, so
+    # concurrent runs adding the same asset never see a partial file.
+    with path.open("rb") as file:
+        digest = hashlib.file_digest(file, "md5").hexdigest()
+    if digest != stored.stem:
+        logger.warning("%s does not match its hash, not storing it", stored.name)
+        return False
+    path.replace(stored)
+    return True
+
+
+def reflink(src: Path, dest: Path) -> bool:
+    if sys.platform != "linux":
+        return False
+    import fcntl
+
+    with src.open("rb") as src_file, dest.open("wb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def link_or_copy(src: Path, dest: Path) -> None:
+    # A reflink is preferred, as editing the output then cannot change the
+    # stored file.
+    if reflink(src, dest):
+        return
+    dest.unlink(missing_ok=True)
+    try:
+        dest.hardlink_to(src)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def extract_assets(
+    input: Path,
+    zf: ZipFile,
+    assets: dict[str, str],
+    assets_path: Path,
+    store: Path | None = None,
+) -> None:
+    entries = [
+        (zf.getinfo(md5ext), assets_path.joinpath(name))
+        for md5ext, name in assets.items()
+    ]
+    if store is None:
+        extract_entries_parallel(input, entries)
+        return
+    # Assets missing from the store are extracted next to their place in it,
+    # and every output is then linked to the stored copy.
+    missing: list[tuple[ZipInfo, Path, Path]] = []
+    for info, _ in entries:
+        stored = get_store_path(store, info.filename)
+        if not stored.exists():
+            stored.parent.mkdir(parents=True, exist_ok=True)
+            partial = stored.with_name(f"{stored.name}.{os.getpid()}.part")
+            missing.append((info, partial, stored))
+    extract_entries_parallel(input, [(info, partial) for info, partial, _ in missing])
+    for _, partial, stored in missing:
+        if not add_to_store(partial, stored):
+            partial.replace(assets_path.joinpath(assets[stored.name]))
+    for info, path in entries:
+        if not path.exists():
+            link_or_copy(get_store_path(store, info.filename), path)
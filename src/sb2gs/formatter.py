@@ -1,13 +1,22 @@
-import textwrap
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, override
 
-from rich import print
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+# Measures the printed width of a string. Widths are measured once per widget
+# and then cached, so `expand` is linear in the size of the tree.
+type Measure = Callable[[str], int]
+
+INDENT = " " * 4
 
 
 class Widget(ABC):
+    __slots__: tuple[str, ...] = ()
+
     @abstractmethod
-    def get_width(self) -> int:
+    def get_width(self, measure: Measure = len) -> int:
         raise NotImplementedError
 
     @abstractmethod
@@ -15,85 +24,179 @@ class Widget(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def render(self) -> str:
+    def write(self, out: list[str], depth: int) -> None:
         raise NotImplementedError
 
+    def render(self, depth: int = 0) -> str:
+        out: list[str] = []
+        self.write(out, depth)
+        return "".join(out)
 
-@dataclass
+
+@dataclass(slots=True)
 class Text(Widget):
     value: str
+    width: int | None = field(default=None, init=False, repr=False, compare=False)
 
-    def get_width(self) -> int:
-        return len(self.value)
+    @override
+    def get_width(self, measure: Measure = len) -> int:
+        if self.width is None:
+            self.width = measure(self.value)
+        return self.width
 
+    @override
     def get_height(self) -> int:
         return 1
 
-    def render(self) -> str:
-        return self.value
+    @override
+    def write(self, out: list[str], depth: int) -> None:
+        out.append(self.value)
 
 
-@dataclass
+@dataclass(slots=True)
 class Block(Widget):
     opening: str
     closing: str
-    children: list[Widget]
+    # Strings are children made of plain text.
+    children: Sequence[Widget | str]
     comma: bool = True
     expand: bool = False
-
-    def get_width(self) -> int:
+    # Width when laid out on one line.
+    width: int | None = field(default=None, init=False, repr=False, compare=False)
+    # The children of a block made only of plain text, such as a long list
+    # initializer. These are measured and written in bulk.
+    texts: list[str] | None = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        texts = [child for child in self.children if isinstance(child, str)]
+        self.texts = texts if len(texts) == len(self.children) else None
+
+    @override
+    def get_width(self, measure: Measure = len) -> int:
         if self.expand:
             return max(
-                len(self.opening),
-                len(self.closing),
-                *(4 + child.get_width() for child in self.children),
+                measure(self.opening),
+                measure(self.closing),
+                *(len(INDENT) + width(child, measure) for child in self.children),
             )
-        return sum(
-            (
-                len(self.opening),
-                *(child.get_width() for child in self.children),
-                len(self.closing),
-                max(len(self.children) - 1, 0) * 2 if self.comma else 0,
+        if self.width is None:
+            if self.texts is not None:
+                children = measure("".join(self.texts))
+            else:
+                children = sum(width(child, measure) for child in self.children)
+            self.width = sum(
+                (
+                    measure(self.opening),
+                    children,
+                    measure(self.closing),
+                    max(len(self.children) - 1, 0) * 2 if self.comma else 0,
+                )
             )
-        )
+        return self.width
 
+    @override
     def get_height(self) -> int:
         if self.expand:
-            return 2 + sum(child.get_height() for child in self.children)
+            return 2 + sum(
+                1 if isinstance(child, str) else child.get_height()
+                for child in self.children
+            )
         return 1
 
-    def render(self) -> str:
+    @override
+    def write(self, out: list[str], depth: int) -> None:
+        # `depth` is the indentation level of the line the block starts on.
         if self.expand:
-            out = self.opening + "\n"
-            for child in self.children:
-                out += textwrap.indent(child.render(), " " * 4)
-                out += ",\n"
-            out += self.closing
-            return out
-
-        out = self.opening
-        for i, child in enumerate(self.children):
-            if self.comma and i != 0:
-                out += ", "
-            out += child.render()
-        out += self.closing
-        return out
+            indent = INDENT * (depth + 1)
+            out.append(self.opening.rstrip())
+            out.append("\n")
+            if self.texts is not None:
+                if self.texts:
+                    out.append(indent)
+                    out.append((",\n" + indent).join(self.texts))
+                    out.append(",\n")
+            else:
+                for child in self.children:
+                    out.append(indent)
+                    write(out, child, depth + 1)
+                    out.append(",\n")
+            out.append(INDENT * depth)
+            out.append(self.closing)
+            return
+
+        out.append(self.opening)
+        if self.texts is not None:
+            out.append((", " if self.comma else "").join(self.texts))
+        else:
+            for i, child in enumerate(self.children):
+                if self.comma and i != 0:
+                    out.append(", ")
+                write(out, child, depth)
+        out.append(self.closing)
+
+
+def width(widget: Widget | str, measure: Measure = len) -> int:
+    if isinstance(widget, str):
+        return measure(widget)
+    return widget.get_width(measure)
+
+
+def write(out: list[str], widget: Widget | str, depth: int) -> None:
+    if isinstance(widget, str):
+        out.append(widget)
+    else:
+        widget.write(out, depth)
+
+
+def dump(tree: Widget | str) -> Any:
+    # JSON compatible form of a tree that has not been laid out yet.
+    if isinstance(tree, str):
+        return tree
+    if isinstance(tree, Text):
+        return tree.value
+    if isinstance(tree, Block):
+        children = [dump(child) for child in tree.children]
+        return [tree.opening, tree.closing, children, tree.comma]
+    msg = f"Cannot dump {type(tree).__name__}"
+    raise TypeError(msg)
+
+
+def load(data: Any, substitute: Callable[[str], str]) -> Widget | str:
+    # Rebuilds a tree from `dump`, passing all of its text through `substitute`.
+    if isinstance(data, str):
+        return substitute(data)
+    opening, closing, children, comma = data
+    return Block(
+        substitute(opening),
+        substitute(closing),
+        [load(child, substitute) for child in children],
+        comma,
+    )
 
 
 MAX_WIDTH = 88
 
 
-def expand(tree: Widget, max_width: int = MAX_WIDTH) -> None:
+def expand(
+    tree: Widget | str, max_width: int = MAX_WIDTH, measure: Measure = len
+) -> None:
     if not isinstance(tree, Block):
         return
-    if tree.get_width() <= max_width:
+    if tree.get_width(measure) <= max_width:
+        return
+    # Moving a lone piece of text onto its own line would not make it fit.
+    if len(tree.children) == 1 and not isinstance(tree.children[0], Block):
         return
     tree.expand = True
+    if tree.texts is not None:
+        return
     for child in tree.children:
-        expand(child, max_width - 4)
+        expand(child, max_width - len(INDENT), measure)
 
 
 if __name__ == "__main__":
+    from rich import print
+
     tree = Block(
         "{",
         "}",
@@ -1,62 +1,37 @@
-import builtins
-import logging
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING
 
-from ._types import InputType
+from ._types import InputKind
 
 if TYPE_CHECKING:
-    from ._types import Block
+    from ._types import Block, Input
     from .decompile_sprite import Ctx
 
-logger = logging.getLogger(__name__)
 
-
-def block_id(input: builtins.list[Any] | None) -> str | None:
-    if input is None:
-        return None
-    if isinstance(input[1], str):
-        return input[1]
-    return None
-
-
-def block_value(input: builtins.list[Any] | None) -> int | float | str | None:
-    if input is None:
-        return None
-    if not isinstance(input[1], builtins.list):
-        return None
-    if len(input[1]) < 2:
+def block_id(input: Input | None) -> int | None:
+    if input is None or input.kind is not InputKind.BLOCK:
         return None
-    value = input[1][1]
-    logger.info(input)
-    assert isinstance(value, (str, int, float))
-    return value
+    return input.value
 
 
 def block(ctx: Ctx, block: Block, input_name: str) -> Block | None:
-    if id := block_id(block.inputs._.get(input_name)):
+    if (id := block_id(block.inputs.get(input_name))) is not None:
         return ctx.blocks[id]
     return None
 
 
-def variable(input: builtins.list[Any] | None) -> str | None:
-    if input is None:
+def literal(input: Input | None) -> int | float | str | None:
+    if input is None or input.kind is not InputKind.LITERAL:
         return None
-    if not isinstance(input[1], builtins.list):
-        return None
-    if len(input[1]) < 2:
-        return None
-    if input[1][0] != InputType.VAR:
-        return None
-    return input[1][1]
+    return input.value
 
 
-def list(input: builtins.list[Any] | None) -> str | None:
-    if input is None:
-        return None
-    if not isinstance(input[1], builtins.list):
+def variable(input: Input | None) -> str | None:
+    if input is None or input.kind is not InputKind.VARIABLE:
         return None
-    if len(input[1]) < 2:
-        return None
-    if input[1][0] != InputType.LIST:
+    return input.value
+
+
+def list(input: Input | None) -> str | None:
+    if input is None or input.kind is not InputKind.LIST:
         return None
-    return input[1][1]
+    return input.value
@@ -0,0 +1,220 @@
+import io
+import json
+import re
+from typing import IO, TYPE_CHECKING, Any
+
+from . import custom_blocks
+from ._types import (
+    EMPTY_INPUT,
+    Block,
+    Index,
+    Input,
+    InputKind,
+    InputType,
+    Mutation,
+    Procedure,
+)
+from .json_object import JSONObject
+from .utils import unwrap
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterable
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+DECODER = json.JSONDecoder()
+# Enough of each target to name assets and write goboscript.toml.
+METADATA_KEYS = ("isStage", "name", "layerOrder", "costumes", "sounds", "comments")
+PRIMITIVE_KINDS = {
+    InputType.BROADCAST: InputKind.BROADCAST,
+    InputType.VAR: InputKind.VARIABLE,
+    InputType.LIST: InputKind.LIST,
+}
+
+
+def wrap(value: Any) -> Any:
+    if isinstance(value, dict):
+        return JSONObject({k: wrap(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+    return value
+
+
+def load_input(input: list[Any], index: dict[str, int]) -> Input:
+    # [shadow, value, obscured]: value is a block ID or a primitive. The obscured
+    # shadow is never decompiled.
+    value = input[1] if len(input) > 1 else None
+    if isinstance(value, str):
+        if (block_id := index.get(value)) is None:
+            return EMPTY_INPUT
+        return Input(InputKind.BLOCK, block_id)
+    if not isinstance(value, list) or len(value) < 2:
+        return EMPTY_INPUT
+    return Input(PRIMITIVE_KINDS.get(value[0], InputKind.LITERAL), value[1])
+
+
+def load_id(block_id: str | None, index: dict[str, int]) -> int | None:
+    return None if block_id is None else index.get(block_id)
+
+
+def load_block(data: dict[str, Any], index: dict[str, int]) -> Block:
+    mutation = data.get("mutation")
+    return Block(
+        data["opcode"],
+        load_id(data.get("next"), index),
+        load_id(data.get("parent"), index),
+        {
+            name: load_input(input, index)
+            for name, input in data.get("inputs", {}).items()
+        },
+        data.get("fields", {}),
+        data.get("shadow", False),
+        data.get("topLevel", False),
+        data.get("x", 0),
+        data.get("y", 0),
+        None if mutation is None else Mutation.from_json(mutation),
+    )
+
+
+def load_blocks(data: dict[str, Any]) -> list[Block | list[Any]]:
+    # Block IDs are interned to their position in the arena.
+    index = {block_id: i for i, block_id in enumerate(data)}
+    # Top-level variable and list reporters are stored as bare arrays.
+    return [
+        block if isinstance(block, list) else load_block(block, index)
+        for block in data.values()
+    ]
+
+
+def load_procedure(block: Block) -> Procedure:
+    mutation = unwrap(block.mutation)
+    return Procedure(
+        custom_blocks.get_proccode(block),
+        custom_blocks.get_name(block),
+        tuple(json.loads(mutation.argumentids or "[]")),
+        tuple(json.loads(mutation.argumentnames or "[]")),
+        mutation.warp != "false",
+    )
+
+
+def load_index(blocks: list[Block | list[Any]]) -> Index:
+    index = Index(parents=[None] * len(blocks), children=[[] for _ in blocks])
+    for block_id, block in enumerate(blocks):
+        if isinstance(block, list):
+            continue
+        if block.topLevel:
+            index.roots.append(block_id)
+        index.opcodes.setdefault(block.opcode, []).append(block_id)
+        if block.next is not None:
+            index.parents[block.next] = block_id
+        for input in block.inputs.values():
+            if input.kind is InputKind.BLOCK:
+                index.parents[input.value] = block_id
+                index.children[block_id].append(input.value)
+        if block.mutation is None or (proccode := block.mutation.proccode) is None:
+            continue
+        if block.opcode == "procedures_prototype" or (
+            block.opcode == "procedures_call" and proccode not in index.procedures
+        ):
+            index.procedures[proccode] = load_procedure(block)
+    return index
+
+
+def load_target(data: dict[str, Any]) -> JSONObject:
+    blocks = load_blocks(data.pop("blocks", {}))
+    target = wrap(data)
+    target._["blocks"] = blocks
+    target._["index"] = load_index(blocks)
+    return target
+
+
+class JSONReader:
+    def __init__(self, file: IO[bytes]) -> None:
+        self.file: io.TextIOWrapper = io.TextIOWrapper(file, encoding="utf-8")
+        self.buffer: str = ""
+        self.pos: int = 0
+
+    def fill(self) -> bool:
+        # Grow reads with the pending value so retrying raw_decode stays linear.
+        chunk = self.file.read(max(CHUNK_SIZE, len(self.buffer) - self.pos))
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = unwrap(WHITESPACE_RE.match(self.buffer, self.pos)).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            msg = f"Expecting {char!r}"
+            raise json.JSONDecodeError(msg, self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_targets(file: IO[bytes]) -> Generator[dict[str, Any]]:
+    reader = JSONReader(file)
+    reader.expect("{")
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+        if key != "targets":
+            reader.value()
+        else:
+            reader.expect("[")
+            while reader.peek() != "]":
+                yield reader.value()
+                if reader.peek() == ",":
+                    reader.pos += 1
+            return
+        if reader.peek() == ",":
+            reader.pos += 1
+
+
+def load_target_metadata(target: dict[str, Any]) -> JSONObject:
+    return wrap({key: target[key] for key in METADATA_KEYS if key in target})
+
+
+def load_project_metadata(targets: Iterable[dict[str, Any]]) -> JSONObject:
+    return JSONObject({"targets": [load_target_metadata(target) for target in targets]})
+
+
+def sort_targets(targets: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    stage = next(target for target in targets if target["isStage"])
+    return [stage, *(target for target in targets if not target["isStage"])]
+
+
+def stage_first(targets: Iterable[dict[str, Any]]) -> Generator[dict[str, Any]]:
+    # Same order as sort_targets, in a single pass. Targets before the stage in
+    # the array, normally none, are held until it is found.
+    held: list[dict[str, Any]] = []
+    targets = iter(targets)
+    for target in targets:
+        if target["isStage"]:
+            yield target
+            break
+        held.append(target)
+    while held:
+        yield held.pop(0)
+    yield from targets
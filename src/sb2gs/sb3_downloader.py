@@ -1,5 +1,8 @@
+import asyncio
 import json
-from typing import TYPE_CHECKING
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
 from zipfile import ZipFile
 
 import httpx
@@ -7,32 +10,135 @@ import httpx
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from .download_cache import DownloadCache
 
-def download_sb3(id: str, outfile: str | Path) -> None:
-    res = httpx.get(f"https://api.scratch.mit.edu/projects/{id}")
-    res.raise_for_status()
-    token = res.json()["project_token"]
-    res = httpx.get(f"https://projects.scratch.mit.edu/{id}?token={token}")
-    res.raise_for_status()
-    data = res.json()
-    assets = {
-        *(
-            costume["md5ext"]
-            for target in data["targets"]
-            for costume in target["costumes"]
-        ),
-        *(
-            costume["md5ext"]
-            for target in data["targets"]
-            for costume in target["sounds"]
-        ),
+logger = logging.getLogger(__name__)
+
+# Assets are fetched over at most this many pooled connections at once.
+DOWNLOAD_CONNECTIONS = 16
+TIMEOUT = 30.0
+# Failed requests are retried this many times, waiting RETRY_DELAY seconds
+# before the first retry and twice as long before each one after that.
+MAX_RETRIES = 4
+RETRY_DELAY = 0.5
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass(frozen=True)
+class Endpoints:
+    api: str
+    projects: str
+    assets: str
+
+    def project_url(self, id: str) -> str:
+        return f"{self.api}/projects/{id}"
+
+    def project_json_url(self, id: str, token: str) -> str:
+        return f"{self.projects}/{id}?token={token}"
+
+    def asset_url(self, md5ext: str) -> str:
+        return f"{self.assets}/internalapi/asset/{md5ext}/get/"
+
+
+SCRATCH = Endpoints(
+    api="https://api.scratch.mit.edu",
+    projects="https://projects.scratch.mit.edu",
+    assets="https://assets.scratch.mit.edu",
+)
+
+
+async def fetch(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    delay = RETRY_DELAY
+    for _ in range(MAX_RETRIES):
+        try:
+            res = await client.get(url)
+        except httpx.TransportError as e:
+            reason = str(e) or type(e).__name__
+        else:
+            if res.status_code not in RETRY_STATUS_CODES:
+                return res.raise_for_status()
+            reason = f"status {res.status_code}"
+        logger.warning("Retrying %s in %.1fs after %s", url, delay, reason)
+        await asyncio.sleep(delay)
+        delay *= 2
+    res = await client.get(url)
+    return res.raise_for_status()
+
+
+def get_assets(data: dict[str, Any]) -> set[str]:
+    return {
+        asset["md5ext"]
+        for target in data["targets"]
+        for key in ("costumes", "sounds")
+        for asset in target[key]
     }
-    with ZipFile(outfile, "w") as zf:
-        zf.writestr("project.json", json.dumps(data))
-        for md5ext in assets:
-            res = httpx.get(
-                f"https://assets.scratch.mit.edu/internalapi/asset/{md5ext}/get/"
-            )
-            res.raise_for_status()
-            content = res.read()
-            zf.writestr(md5ext, content)
+
+
+async def download_asset(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    endpoints: Endpoints,
+    md5ext: str,
+) -> tuple[str, bytes]:
+    # The semaphore keeps queued requests from timing out while they wait for a
+    # connection from the pool.
+    async with semaphore:
+        res = await fetch(client, endpoints.asset_url(md5ext))
+    return md5ext, res.content
+
+
+async def download_sb3_async(
+    id: str,
+    outfile: str | Path,
+    endpoints: Endpoints = SCRATCH,
+    cache: DownloadCache | None = None,
+) -> None:
+    limits = httpx.Limits(
+        max_connections=DOWNLOAD_CONNECTIONS,
+        max_keepalive_connections=DOWNLOAD_CONNECTIONS,
+    )
+    async with httpx.AsyncClient(limits=limits, timeout=TIMEOUT) as client:
+        res = await fetch(client, endpoints.project_url(id))
+        metadata = res.json()
+        modified = metadata.get("history", {}).get("modified")
+        data = cache and cache.get_project(id, modified)
+        if data is None:
+            token = metadata["project_token"]
+            res = await fetch(client, endpoints.project_json_url(id, token))
+            data = res.json()
+            if cache:
+                cache.add_project(id, modified, data)
+        semaphore = asyncio.Semaphore(DOWNLOAD_CONNECTIONS)
+        tasks: list[asyncio.Task[tuple[str, bytes]]] = []
+        try:
+            with ZipFile(outfile, "w") as zf:
+                zf.writestr("project.json", json.dumps(data))
+                for md5ext in get_assets(data):
+                    content = cache and cache.get_asset(md5ext)
+                    if content is not None:
+                        zf.writestr(md5ext, content)
+                        continue
+                    task = download_asset(client, semaphore, endpoints, md5ext)
+                    tasks.append(asyncio.create_task(task))
+                # Assets are written as they arrive, so only those still in
+                # flight are held in memory.
+                for task in asyncio.as_completed(tasks):
+                    md5ext, content = await task
+                    zf.writestr(md5ext, content)
+                    if cache:
+                        cache.add_asset(md5ext, content)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    if cache:
+        cache.evict()
+
+
+def download_sb3(
+    id: str,
+    outfile: str | Path,
+    endpoints: Endpoints = SCRATCH,
+    cache: DownloadCache | None = None,
+) -> None:
+    asyncio.run(download_sb3_async(id, outfile, endpoints, cache))
@@ -1,3 +1,4 @@
+import json
 from collections.abc import Callable
 from contextlib import contextmanager
 from typing import (
@@ -9,37 +10,101 @@ from typing import (
     override,
 )
 
+from . import formatter
+
 if TYPE_CHECKING:
     from collections.abc import Callable, Generator, Sequence
+    from typing import TextIO
+
+    from .formatter import Measure, Widget
+
+# Number of fragments buffered before they are joined and written to the file,
+# lowered in deeply indented code so buffered indentation stays under
+# INDENT_BUDGET characters.
+FLUSH_SIZE = 1 << 14
+INDENT_BUDGET = 1 << 20
+# Starts a line holding a widget that is laid out later, by `lay_out_deferred`.
+DEFERRED_WIDGET = "\x01"
 
 
 class StringBuilder:
-    def __init__(self, indent_width: int = 4) -> None:
+    # Without a file, everything printed is kept until `str()` is called. With a
+    # file, fragments are written out in batches, so memory use does not grow
+    # with the size of the output. Call `flush` when done.
+    def __init__(self, indent_width: int = 4, file: TextIO | None = None) -> None:
         self.strings: list[str] = []
+        self.file: TextIO | None = file
         self.indent_width: int = indent_width
         self.indent_level: int = 0
+        self.prefix: str = ""
+        self.flush_size: int = FLUSH_SIZE
+        self.measure: Measure = len
+        # Whether widgets contain placeholders, whose widths are not known yet.
+        self.deferred: bool = False
 
     def print(self, *strings: str) -> None:
         self.strings.extend(strings)
+        if len(self.strings) >= self.flush_size and self.file is not None:
+            self.flush()
 
     def println(self, *strings: str) -> None:
         self.strings.extend(strings)
         self.strings.append("\n")
+        if len(self.strings) >= self.flush_size and self.file is not None:
+            self.flush()
 
     def iprint(self, *strings: str) -> None:
-        self.strings.append(" " * self.indent_level * self.indent_width)
+        self.strings.append(self.prefix)
         self.strings.extend(strings)
+        if len(self.strings) >= self.flush_size and self.file is not None:
+            self.flush()
 
     def iprintln(self, *strings: str) -> None:
-        self.strings.append(" " * self.indent_level * self.indent_width)
+        self.strings.append(self.prefix)
         self.strings.extend(strings)
         self.strings.append("\n")
+        if len(self.strings) >= self.flush_size and self.file is not None:
+            self.flush()
+
+    def iprint_widget(self, widget: Widget | str) -> None:
+        # Wraps the widget to fit in `formatter.MAX_WIDTH` at the current indent.
+        # Must be followed by the end of the line.
+        if self.deferred:
+            data = [self.indent_level, formatter.dump(widget)]
+            self.print(DEFERRED_WIDGET, json.dumps(data))
+            return
+        formatter.expand(widget, formatter.MAX_WIDTH - len(self.prefix), self.measure)
+        out = [self.prefix]
+        formatter.write(out, widget, self.indent_level)
+        self.print(*out)
+
+    def flush(self) -> None:
+        if self.file is None:
+            return
+        self.file.write("".join(self.strings))
+        self.strings.clear()
+
+    def set_indent_level(self, indent_level: int) -> None:
+        self.indent_level = indent_level
+        self.prefix = " " * indent_level * self.indent_width
+        self.flush_size = min(FLUSH_SIZE, INDENT_BUDGET // max(len(self.prefix), 1))
 
     @contextmanager
     def indent(self) -> Generator[None]:
-        self.indent_level += 1
+        self.set_indent_level(self.indent_level + 1)
         yield
-        self.indent_level -= 1
+        self.set_indent_level(self.indent_level - 1)
+
+    @contextmanager
+    def capture(self) -> Generator[list[str]]:
+        # Collects what is printed inside the block instead of emitting it.
+        strings, file = self.strings, self.file
+        captured: list[str] = []
+        self.strings, self.file = captured, None
+        try:
+            yield captured
+        finally:
+            self.strings, self.file = strings, file
 
     @override
     def __str__(self) -> str:
@@ -78,3 +143,14 @@ class StringBuilder:
                 callback(item, *args, **kwargs)
             if i != len(items) - 1:
                 self.print(", ")
+
+
+def lay_out_deferred(line: str, substitute: Callable[[str], str]) -> str:
+    # Lays out a line written by `iprint_widget` in deferred mode, once
+    # `substitute` can replace the placeholders in it.
+    indent_level, data = json.loads(line.removeprefix(DEFERRED_WIDGET))
+    builder = StringBuilder()
+    builder.set_indent_level(indent_level)
+    builder.iprint_widget(formatter.load(data, substitute))
+    builder.println()
+    return str(builder)
@@ -1,9 +1,14 @@
-import contextlib
 import functools
 import itertools
 import json
 import logging
+import math
 import re
+from json.encoder import encode_basestring_ascii
+from typing import TYPE_CHECKING, override
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
 
 WHITESPACE_RE = re.compile(r"[\s.\-:]+")
 INVALID_CHARS_RE = re.compile(r"[^a-zA-Z_0-9]")
@@ -76,7 +81,13 @@ KEYWORDS = {
     "set_layer_order",
     "var",
 }
-identifier_map: dict[str, str] = {}
+PLACEHOLDER_RE = re.compile(r"\x00(\d+)\x00")
+# JSON number grammar, which only allows ASCII digits. A literal is emitted as-is
+# if json.loads would parse it to a number that json.dumps writes back
+# identically.
+NUMBER_RE = re.compile(r"-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?")
+NON_FINITE_LITERALS = {"NaN", "Infinity", "-Infinity"}
+STRING_CACHE_SIZE = 4096
 
 
 @functools.cache
@@ -96,10 +107,7 @@ def get_blocknames() -> set[str]:
     return blocknames
 
 
-def identifier(og: str) -> str:
-    if og in identifier_map:
-        return identifier_map[og]
-
+def sanitize(og: str) -> str:
     iden = og
 
     iden = "_".join(WHITESPACE_RE.split(iden))
@@ -117,31 +125,104 @@ def identifier(og: str) -> str:
     if iden == "" or iden[0] in "0123456789":
         iden = "_" + iden
 
-    i = 2  # identifier_1 would be the original one, i.e. #1, so it doesnt need an index.
-    new_iden = iden
-    while new_iden in identifier_map.values():
-        new_iden = f"{iden}{i}"
-        i += 1
-
-    identifier_map[og] = new_iden
-    logging.info(f"Mapped identifier {og!r} -> {new_iden!r}")
-
-    return new_iden
-
-
+    return iden
+
+
+class Identifiers:
+    deferred: bool = False
+
+    def __init__(self) -> None:
+        self.map: dict[str, str] = {}
+        self.used: set[str] = set()
+        # Next numeric suffix to try for each base name. Every smaller suffix
+        # was already taken when it was last tried, and names are never freed.
+        self.suffixes: dict[str, int] = {}
+
+    def identifier(self, og: str) -> str:
+        if og in self.map:
+            return self.map[og]
+
+        iden = sanitize(og)
+
+        new_iden = iden
+        if new_iden in self.used:
+            # identifier_1 would be the original one, i.e. #1, so it doesnt need an
+            # index.
+            i = self.suffixes.get(iden, 2)
+            new_iden = f"{iden}{i}"
+            while new_iden in self.used:
+                i += 1
+                new_iden = f"{iden}{i}"
+            self.suffixes[iden] = i + 1
+
+        self.map[og] = new_iden
+        self.used.add(new_iden)
+        logging.info("Mapped identifier %r -> %r", og, new_iden)
+
+        return new_iden
+
+    def measure(self, text: str) -> int:
+        return len(text)
+
+    def resolve(self, names: list[str]) -> Callable[[str], str]:
+        # Allocates the names, and returns a function that substitutes them for
+        # their placeholders in text.
+        resolved = [self.identifier(og) for og in names]
+        return functools.partial(
+            PLACEHOLDER_RE.sub, lambda match: resolved[int(match[1])]
+        )
+
+
+class DeferredIdentifiers(Identifiers):
+    # Identifiers are emitted as placeholders and allocated later by
+    # `Identifiers.resolve`, in the order they were first used.
+    deferred: bool = True
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.names: dict[str, int] = {}
+        self.bases: list[str] = []
+
+    @override
+    def identifier(self, og: str) -> str:
+        index = self.names.get(og)
+        if index is None:
+            index = self.names[og] = len(self.bases)
+            self.bases.append(sanitize(og))
+        return f"\x00{index}\x00"
+
+    @override
+    def measure(self, text: str) -> int:
+        # A lower bound: placeholders are measured as their sanitized names,
+        # without the numeric suffix added to a clashing name.
+        if "\x00" not in text:
+            return len(text)
+        return len(PLACEHOLDER_RE.sub(lambda match: self.bases[int(match[1])], text))
+
+
+@functools.lru_cache(maxsize=STRING_CACHE_SIZE)
 def string(text: str) -> str:
-    return json.dumps(text)
+    # Same as json.dumps(text), without going through the encoder.
+    return encode_basestring_ascii(text)
 
 
-def number(value: float) -> str:
+def number(value: int | float) -> str:  # noqa: PYI041
+    # Written out as a union, so the type checks below narrow it. Non-finite
+    # floats and subclasses such as bool are left to json.
+    if type(value) is int:
+        return int.__repr__(value)
+    if type(value) is float and math.isfinite(value):
+        return float.__repr__(value)
     return json.dumps(value)
 
 
 def is_goboscript_literal(text: str) -> bool:
-    with contextlib.suppress(json.JSONDecodeError):
-        parsed = json.loads(text)
-        return type(parsed) in {int, float} and json.dumps(parsed) == text
-    return False
+    match = NUMBER_RE.fullmatch(text)
+    if match is None:
+        return text in NON_FINITE_LITERALS
+    if match[1] is None and match[2] is None:
+        return text != "-0"
+    return float.__repr__(float(text)) == text
 
 
 def value(text: float | str) -> str:
@@ -0,0 +1,34 @@
+import hashlib
+import random
+import threading
+from typing import TYPE_CHECKING
+
+import pytest
+
+from sb2gs import sb3_downloader
+
+from .scratch_server import Scratch
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+ASSET_COUNT = 50
+
+
+@pytest.fixture
+def scratch(monkeypatch: pytest.MonkeyPatch) -> Generator[Scratch]:
+    monkeypatch.setattr(sb3_downloader, "RETRY_DELAY", 0)
+    rng = random.Random(0)  # noqa: S311
+    contents = [
+        rng.randbytes(rng.randrange(1 << 8, 1 << 12)) for _ in range(ASSET_COUNT)
+    ]
+    assets = {f"{hashlib.md5(c).hexdigest()}.png": c for c in contents}  # noqa: S324
+    costumes = [{"md5ext": md5ext} for md5ext in assets]
+    project = {"targets": [{"costumes": costumes, "sounds": []}]}
+    metadata = {"project_token": "token", "history": {"modified": "0"}}
+    server = Scratch(assets, project, metadata)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
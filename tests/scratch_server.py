@@ -0,0 +1,79 @@
+import json
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, override
+from zipfile import ZipFile
+
+from sb2gs.sb3_downloader import Endpoints, download_sb3
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from sb2gs.download_cache import DownloadCache
+
+
+class Scratch(ThreadingHTTPServer):
+    # A local stand-in for the Scratch servers, serving a single project.
+    daemon_threads: bool = True
+
+    def __init__(
+        self,
+        assets: dict[str, bytes],
+        project: dict[str, Any],
+        metadata: dict[str, Any],
+    ) -> None:
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.assets: dict[str, bytes] = assets
+        self.project: dict[str, Any] = project
+        self.metadata: dict[str, Any] = metadata
+        # The first request for each of these assets fails with status 503.
+        self.failing: set[str] = set()
+        self.requests: Counter[str] = Counter()
+        url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.endpoints: Endpoints = Endpoints(url, url, url)
+
+    def download(
+        self, path: Path, cache: DownloadCache | None = None
+    ) -> tuple[dict[str, Any], dict[str, bytes]]:
+        # Returns the downloaded project and assets, counting only the requests
+        # made for this download.
+        self.requests.clear()
+        download_sb3("1", path, self.endpoints, cache)
+        with ZipFile(path) as zf:
+            project = json.loads(zf.read("project.json"))
+            names = [name for name in zf.namelist() if name != "project.json"]
+            return project, {name: zf.read(name) for name in names}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version: str = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        scratch = self.server
+        assert isinstance(scratch, Scratch)
+        if self.path.startswith("/internalapi/asset/"):
+            scratch.requests["asset"] += 1
+            md5ext = self.path.split("/")[3]
+            if md5ext in scratch.failing:
+                scratch.failing.discard(md5ext)
+                self.send(503, b"")
+            elif md5ext in scratch.assets:
+                self.send(200, scratch.assets[md5ext])
+            else:
+                self.send(404, b"")
+        elif self.path.startswith("/projects/"):
+            scratch.requests["metadata"] += 1
+            self.send(200, json.dumps(scratch.metadata).encode())
+        else:
+            scratch.requests["project"] += 1
+            self.send(200, json.dumps(scratch.project).encode())
+
+    def send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @override
+    def log_message(self, format: str, *args: object) -> None:
+        pass
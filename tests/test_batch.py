@@ -0,0 +1,56 @@
+import contextlib
+import os
+import signal
+import time
+from typing import TYPE_CHECKING
+
+import pytest
+
+from sb2gs import batch
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGALRM"), reason="needs SIGALRM")
+def test_timeout_is_not_caught_as_oserror(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def decompile(*_args: object, **_kwargs: object) -> None:
+        # Like the copy and link fallbacks in sb2gs.extract.
+        with contextlib.suppress(OSError):
+            time.sleep(1)
+        time.sleep(1)
+
+    monkeypatch.setattr(batch, "decompile", decompile)
+    options = batch.Options(timeout=0.05)
+    result = batch.decompile_project(tmp_path / "a.sb3", tmp_path / "a", options)
+    assert result.status == "timeout"
+    assert batch.summarize([result], result.seconds)["timed_out"] == 1
+
+
+def decompile(input: Path, *_args: object, **_kwargs: object) -> None:
+    if input.stem == "crash":
+        os._exit(1)
+    # Still running when the other worker dies.
+    time.sleep(0.2)
+
+
+def start_project(
+    index: int, input: Path, output: Path, options: batch.Options
+) -> batch.Result:
+    # Runs in a worker process, which imports its own unpatched sb2gs.batch.
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(batch, "decompile", decompile)
+        return batch.start_project(index, input, output, options)
+
+
+def test_crashing_project_does_not_fail_others(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(batch, "start_project", start_project)
+    names = ["crash", *(f"ok{i}" for i in range(6))]
+    projects = [tmp_path / f"{name}.sb3" for name in names]
+    outputs = [tmp_path / name for name in names]
+    results = batch.run_batch(projects, outputs, 2, batch.Options())
+    assert [result.status for result in results] == ["crashed"] + ["ok"] * 6
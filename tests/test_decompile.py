@@ -0,0 +1,98 @@
+import json
+from typing import TYPE_CHECKING, Any
+from zipfile import ZipFile
+
+import pytest
+
+from sb2gs.decompile import Pool, decompile
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def make_target(is_stage: bool, name: str, variable: str) -> dict[str, Any]:
+    # Says the variable joined with a string, in a statement that only fits on
+    # one line while the variable keeps its sanitized name.
+    blocks = {
+        "hat": {
+            "opcode": "event_whenflagclicked",
+            "next": "say",
+            "parent": None,
+            "inputs": {},
+            "fields": {},
+            "shadow": False,
+            "topLevel": True,
+            "x": 0,
+            "y": 0,
+        },
+        "say": {
+            "opcode": "looks_sayforsecs",
+            "next": None,
+            "parent": "hat",
+            "inputs": {"MESSAGE": [3, "join", [10, ""]], "SECS": [1, [4, "2"]]},
+            "fields": {},
+            "shadow": False,
+            "topLevel": False,
+        },
+        "join": {
+            "opcode": "operator_join",
+            "next": None,
+            "parent": "say",
+            "inputs": {
+                "STRING1": [3, [12, variable, "var"], [10, ""]],
+                "STRING2": [1, [10, "x" * 68]],
+            },
+            "fields": {},
+            "shadow": False,
+            "topLevel": False,
+        },
+    }
+    target = {
+        "isStage": is_stage,
+        "name": name,
+        "variables": {"var": [variable, 0]},
+        "lists": {"list": [variable, ["x" * 40, "y" * 40]]},
+        "broadcasts": {},
+        "blocks": blocks,
+        "comments": {},
+        "currentCostume": 0,
+        "costumes": [],
+        "sounds": [],
+        "volume": 100,
+        "layerOrder": 0 if is_stage else 1,
+    }
+    if not is_stage:
+        target |= {
+            "visible": True,
+            "x": 0,
+            "y": 0,
+            "size": 100,
+            "direction": 90,
+            "draggable": False,
+            "rotationStyle": "all around",
+        }
+    return target
+
+
+def read_output(output: Path) -> dict[str, str]:
+    return {path.name: path.read_text() for path in output.glob("*.gs")}
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_parallel_output_matches_serial(tmp_path: Path, stream: bool) -> None:
+    # The sprite's variable is renamed to foo2 because the stage's is foo, which
+    # only a serial run knows while laying out the sprite.
+    project = {
+        "targets": [make_target(True, "Stage", "foo"), make_target(False, "S1", "Foo")],
+        "monitors": [],
+        "extensions": [],
+        "meta": {},
+    }
+    input = tmp_path / "project.sb3"
+    with ZipFile(input, "w") as zf:
+        zf.writestr("project.json", json.dumps(project))
+    decompile(input, tmp_path / "serial")
+    decompile(input, tmp_path / "parallel", stream=stream, jobs=2, pool=Pool.THREAD)
+    serial = read_output(tmp_path / "serial")
+    assert "foo2" in serial["S1.gs"]
+    assert read_output(tmp_path / "parallel") == serial
@@ -0,0 +1,96 @@
+import os
+from typing import TYPE_CHECKING
+
+import pytest
+
+from sb2gs.download_cache import DownloadCache
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from .scratch_server import Scratch
+
+
+def get_cache_size(cache: DownloadCache) -> int:
+    return sum(path.stat().st_size for path in cache.root.rglob("*") if path.is_file())
+
+
+def test_hit(tmp_path: Path, scratch: Scratch) -> None:
+    cache = DownloadCache(tmp_path / "cache")
+    cold = scratch.download(tmp_path / "project.sb3", cache)
+    assert scratch.requests["asset"] == len(scratch.assets)
+    warm = scratch.download(tmp_path / "project.sb3", cache)
+    assert warm == cold
+    # The metadata is always requested, to check if the project was modified.
+    assert scratch.requests == {"metadata": 1}
+
+
+def test_modified_project_is_downloaded(tmp_path: Path, scratch: Scratch) -> None:
+    cache = DownloadCache(tmp_path / "cache")
+    scratch.download(tmp_path / "project.sb3", cache)
+    scratch.metadata["history"]["modified"] = "1"
+    scratch.download(tmp_path / "project.sb3", cache)
+    assert scratch.requests == {"metadata": 1, "project": 1}
+
+
+def test_project_without_modified_time_is_not_cached(
+    tmp_path: Path, scratch: Scratch
+) -> None:
+    cache = DownloadCache(tmp_path / "cache")
+    del scratch.metadata["history"]
+    scratch.download(tmp_path / "project.sb3", cache)
+    scratch.download(tmp_path / "project.sb3", cache)
+    assert scratch.requests == {"metadata": 1, "project": 1}
+
+
+def test_corrupt_asset_is_downloaded(tmp_path: Path, scratch: Scratch) -> None:
+    cache = DownloadCache(tmp_path / "cache")
+    cold = scratch.download(tmp_path / "project.sb3", cache)
+    md5ext = next(iter(scratch.assets))
+    cache.get_asset_path(md5ext).write_bytes(b"corrupt")
+    assert scratch.download(tmp_path / "project.sb3", cache) == cold
+    assert scratch.requests == {"metadata": 1, "asset": 1}
+    assert cache.get_asset_path(md5ext).read_bytes() == scratch.assets[md5ext]
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [b"", b'{"modified": "0", "proj', b"null", b"[]", b'{"modified": "0"}'],
+)
+def test_corrupt_project_is_a_miss(
+    tmp_path: Path, scratch: Scratch, entry: bytes
+) -> None:
+    cache = DownloadCache(tmp_path / "cache")
+    cold = scratch.download(tmp_path / "project.sb3", cache)
+    path = cache.get_project_path("1")
+    path.write_bytes(entry)
+    assert cache.get_project("1", "0") is None
+    assert not path.exists()
+    path.write_bytes(entry)
+    assert scratch.download(tmp_path / "project.sb3", cache) == cold
+    assert scratch.requests == {"metadata": 1, "project": 1}
+    assert cache.get_project("1", "0") == scratch.project
+
+
+def test_eviction(tmp_path: Path, scratch: Scratch) -> None:
+    cache = DownloadCache(tmp_path / "cache")
+    scratch.download(tmp_path / "project.sb3", cache)
+    cache.max_size = get_cache_size(cache) // 2
+    cache.evict()
+    assert get_cache_size(cache) <= cache.max_size
+    scratch.download(tmp_path / "project.sb3", cache)
+    assert 0 < scratch.requests["asset"] < len(scratch.assets)
+
+
+def test_eviction_skips_partial_files(tmp_path: Path, scratch: Scratch) -> None:
+    cache = DownloadCache(tmp_path / "cache")
+    scratch.download(tmp_path / "project.sb3", cache)
+    size = get_cache_size(cache)
+    # Another process is still writing this file, and it is the oldest.
+    partial = cache.root.joinpath("assets", "download.1.part")
+    partial.write_bytes(bytes(size))
+    os.utime(partial, (0, 0))
+    cache.max_size = size
+    cache.evict()
+    assert partial.exists()
+    assert get_cache_size(cache) == size * 2
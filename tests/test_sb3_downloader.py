@@ -0,0 +1,34 @@
+from typing import TYPE_CHECKING
+
+import httpx
+import pytest
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from .scratch_server import Scratch
+
+
+def test_download(tmp_path: Path, scratch: Scratch) -> None:
+    project, assets = scratch.download(tmp_path / "project.sb3")
+    assert project == scratch.project
+    assert assets == scratch.assets
+    assert scratch.requests == {
+        "metadata": 1,
+        "project": 1,
+        "asset": len(scratch.assets),
+    }
+
+
+def test_failed_requests_are_retried(tmp_path: Path, scratch: Scratch) -> None:
+    failing = set(list(scratch.assets)[::10])
+    scratch.failing |= failing
+    assert scratch.download(tmp_path / "project.sb3")[1] == scratch.assets
+    assert scratch.requests["asset"] == len(scratch.assets) + len(failing)
+
+
+def test_missing_asset_is_an_error(tmp_path: Path, scratch: Scratch) -> None:
+    costumes = scratch.project["targets"][0]["costumes"]
+    costumes.append({"md5ext": "0" * 32 + ".png"})
+    with pytest.raises(httpx.HTTPStatusError):
+        scratch.download(tmp_path / "project.sb3")
@@ -0,0 +1,40 @@
+import contextlib
+import json
+import random
+
+import pytest
+
+from sb2gs import syntax
+
+# Arabic-Indic, fullwidth and Devanagari digits, which \d matches.
+NON_ASCII_DIGITS = "\u0660\u0661\u0662\u0665\uff11\u0967"
+RANDOM_CASES = 5000
+
+
+def json_round_trip(text: str) -> bool:
+    # How literals were classified before is_goboscript_literal matched them.
+    with contextlib.suppress(json.JSONDecodeError):
+        parsed = json.loads(text)
+        return type(parsed) in {int, float} and json.dumps(parsed) == text
+    return False
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["1\u0662", "\u0661", "\uff11", "\u0967", "1.\u0665", "1e\u0663", "-\u0660"],
+)
+def test_non_ascii_digits_are_strings(text: str) -> None:
+    assert not syntax.is_goboscript_literal(text)
+    assert syntax.value(text) == json.dumps(text)
+
+
+def test_literals_match_json_round_trip() -> None:
+    rng = random.Random(0)  # noqa: S311
+    alphabet = "0123456789.-+eE " + NON_ASCII_DIGITS
+    texts = [
+        "".join(rng.choices(alphabet, k=rng.randrange(1, 10)))
+        for _ in range(RANDOM_CASES)
+    ]
+    texts += ["NaN", "Infinity", "-Infinity", "-0", "1e400", "0.1", "1E5"]
+    for text in texts:
+        assert syntax.is_goboscript_literal(text) == json_round_trip(text), text